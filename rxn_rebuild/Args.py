@@ -1,7 +1,11 @@
 from argparse import ArgumentParser
+from .ignore import PRESETS
 
 DEFAULTS = {
     "cspace": "rr2026",
+    "cspace_type": "rr2026",
+    "checkpoint_every": 1000,
+    "chunk_size": 1000,
 }
 
 
@@ -16,12 +20,40 @@ def add_arguments(parser: ArgumentParser) -> ArgumentParser:
     parser.add_argument(
         "--tmpl_rxn_id", type=str, help="Template (original) reaction identifier"
     )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        help="Time budget, in seconds. Template reactions are processed best scored rules first and the ones not processed in time are skipped (default: None)",
+    )
+    parser.add_argument(
+        "--max-templates",
+        dest="max_templates",
+        type=int,
+        default=None,
+        help="Maximum number of template reactions to process, best scored rules first (default: None)",
+    )
+    add_completion_arguments(parser)
+
+    return parser
+
+
+def add_completion_arguments(parser: ArgumentParser) -> ArgumentParser:
+
     parser.add_argument(
         "--to-ignore",
         type=str,
-        help="Name of the file containing the list of compounds to ignore (default: None)",
+        help="Name of the file containing the list of compounds to ignore, separated by commas and/or newlines. Wildcard patterns (e.g. 'MNXM1*') are resolved against the compound IDs of the cache and '@name' refers to a preset (default: None)",
         default=None,
     )
+    parser.add_argument(
+        "--ignore-preset",
+        dest="ignore_presets",
+        action="append",
+        default=[],
+        choices=sorted(PRESETS),
+        help="Preset of compounds to ignore, can be repeated (default: None)",
+    )
     parser.add_argument(
         "--chemical-space",
         dest="cspace",
@@ -29,5 +61,247 @@ def add_arguments(parser: ArgumentParser) -> ArgumentParser:
         type=str,
         help="Chemical space to use (e.g. mnx3.1, mnx4.4...). Determines which configuration files and folders to use both the cache and the input cache (default: %(default)s).",
     )
+    parser.add_argument(
+        "--shm",
+        dest="shm_name",
+        default=None,
+        type=str,
+        help="Name of a cache published in shared memory (see 'rxn_rebuild shm-publish') to attach to instead of loading the cache (default: None)",
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default=None,
+        help="SQLite file of the persistent result store, to reuse results from previous runs made with the same cache data and to save the new ones (default: None)",
+    )
+    parser.add_argument(
+        "--store-max-entries",
+        dest="store_max_entries",
+        type=int,
+        default=None,
+        help="Maximum number of results in the result store, least recently used ones being evicted beyond (default: no limit)",
+    )
+    parser.add_argument(
+        "--structures",
+        type=str,
+        choices=["smiles", "inchi", "inchikey"],
+        default=None,
+        help="Add the structures of all compounds to completed transformations in this format, with the list of compounds with no structure (default: None)",
+    )
+    add_memory_arguments(parser)
+
+    return parser
+
+
+def add_shm_arguments(parser: ArgumentParser) -> ArgumentParser:
+
+    parser.add_argument(
+        "shm_name",
+        type=str,
+        help="Name of the shared memory block",
+    )
+    parser.add_argument(
+        "--chemical-space",
+        dest="cspace",
+        default=DEFAULTS["cspace"],
+        type=str,
+        help="Chemical space to publish (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--unlink",
+        action="store_true",
+        help="Remove the published cache from shared memory instead of publishing it",
+    )
+
+    return parser
+
+
+def add_batch_arguments(parser: ArgumentParser) -> ArgumentParser:
+
+    parser.add_argument(
+        "infile",
+        type=str,
+        help="Tab-separated file with one transformation to complete per line: reaction rule ID, transformation and, optionally, template reaction ID",
+    )
+    parser.add_argument(
+        "outfile",
+        type=str,
+        help="Output file (JSON Lines), one record per input line",
+    )
+    add_rows_arguments(parser)
+    parser.add_argument(
+        "--shard",
+        type=str,
+        default=None,
+        help="Process only the rows whose reaction rule is owned by shard i out of N, given as 'i/N' with 0 <= i < N (default: None). Shard outputs are combined with 'rxn_rebuild merge'.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Journal progress into '<outfile>.journal' and, if this journal already exists, resume the run after its last checkpoint (refused if the input file, the chemical space or the options changed)",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        dest="checkpoint_every",
+        type=int,
+        default=DEFAULTS["checkpoint_every"],
+        help="Number of records between two checkpoints of the journal (default: %(default)s)",
+    )
+    add_completion_arguments(parser)
+
+    return parser
+
+
+def add_rows_arguments(parser: ArgumentParser) -> ArgumentParser:
+
+    parser.add_argument(
+        "--cspace-type",
+        dest="cspace_type",
+        default=DEFAULTS["cspace_type"],
+        type=str,
+        help="Type of the chemical space rules, 'legacy' for rules generated before rr2026 (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--bulk-parse",
+        dest="bulk_parse",
+        action="store_true",
+        help="Parse transformations by chunks of rows at once, with the bulk parser of rxn_rebuild (SMILES, compound IDs and rp2paths stoichiometry style), rather than one by one",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Group the rows of each chunk by reaction rule (and template reaction), so that template reactions and compounds to add are resolved once per group, and report group statistics",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        dest="chunk_size",
+        type=int,
+        default=DEFAULTS["chunk_size"],
+        help="Number of rows read, parsed (--bulk-parse) and grouped (--plan) at once (default: %(default)s)",
+    )
+
+    return parser
+
+
+def add_profile_arguments(parser: ArgumentParser) -> ArgumentParser:
+
+    parser.add_argument(
+        "infile",
+        type=str,
+        help="Tab-separated file with one transformation to complete per line, as for 'rxn_rebuild batch'",
+    )
+    parser.add_argument(
+        "--mode",
+        type=str,
+        choices=["sampling", "deterministic"],
+        default="sampling",
+        help="'sampling' to sample call stacks at regular intervals, with little overhead, or 'deterministic' to trace every function call (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0.001,
+        help="Sampling interval, in seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--output-prefix",
+        dest="output_prefix",
+        type=str,
+        default="rxn_rebuild_profile",
+        help="Prefix of the output files: '<prefix>.load.collapsed' and '<prefix>.complete.collapsed' (collapsed stacks, for flame graphs) and '<prefix>.summary.json' (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=20,
+        help="Number of hottest functions to report per phase (default: %(default)s)",
+    )
+    add_rows_arguments(parser)
+    add_completion_arguments(parser)
+
+    return parser
+
+
+def add_merge_arguments(parser: ArgumentParser) -> ArgumentParser:
+
+    parser.add_argument(
+        "outfile",
+        type=str,
+        help="Merged output file (JSON Lines)",
+    )
+    parser.add_argument(
+        "shard_files",
+        type=str,
+        nargs="+",
+        help="Outputs of 'rxn_rebuild batch --shard', one per shard",
+    )
+
+    return parser
+
+
+def add_memory_arguments(parser: ArgumentParser) -> ArgumentParser:
+
+    parser.add_argument(
+        "--max-memory",
+        dest="max_memory",
+        type=str,
+        default=None,
+        help="Memory budget for the cache (e.g. 512M, 8G). Cache attributes are loaded one by one and the run fails as soon as the memory they take (RSS) exceeds the budget (default: None)",
+    )
+    parser.add_argument(
+        "--memory-report",
+        dest="memory_report",
+        type=str,
+        default=None,
+        help="JSON report of a previous 'rxn_rebuild stats' run, used with --max-memory to fail before loading an attribute which would not fit (default: None)",
+    )
+
+    return parser
+
+
+def add_stats_arguments(parser: ArgumentParser) -> ArgumentParser:
+
+    parser.add_argument(
+        "--chemical-space",
+        dest="cspace",
+        default=DEFAULTS["cspace"],
+        type=str,
+        help="Chemical space to measure (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="File to write the report into, in JSON (default: None)",
+    )
+    add_memory_arguments(parser)
+
+    return parser
+
+
+def add_diff_arguments(parser: ArgumentParser) -> ArgumentParser:
+
+    parser.add_argument(
+        "old_cspace",
+        type=str,
+        help="Chemical space of the old release (e.g. mnx4.4)",
+    )
+    parser.add_argument(
+        "new_cspace",
+        type=str,
+        help="Chemical space of the new release (e.g. rr2026)",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="File to write the reaction rules and template reactions added, removed or changed into, in JSON (default: None)",
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default=None,
+        help="SQLite file of a result store to migrate from the old release to the new one: results depending on changed entries are dropped, to be recomputed by the next runs, the other ones are reused (default: None)",
+    )
 
     return parser
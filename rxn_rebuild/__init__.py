@@ -1,4 +1,5 @@
 from rxn_rebuild.rxn_rebuild import rebuild_rxn
+from rxn_rebuild.stream import iter_rebuild
 from rxn_rebuild._version import __version__
 
-__all__ = ["rebuild_rxn", "__version__"]
+__all__ = ["rebuild_rxn", "iter_rebuild", "__version__"]
@@ -1,9 +1,50 @@
-from rxn_rebuild.rxn_rebuild import rebuild_rxn
+from sys import argv, exit
+from rxn_rebuild.rxn_rebuild import rebuild_rxn, TransfoParseError
+from rxn_rebuild.batch import (
+    read_rows,
+    rebuild_batch,
+    run_batch,
+    parse_shard,
+    merge_shards,
+)
+from rxn_rebuild.journal import JournalError
+from rxn_rebuild.store import ResultStore, migrate_results
+from rxn_rebuild.delta import diff_spaces
+from rxn_rebuild.fingerprint import cache_fingerprint
+from rxn_rebuild.ignore import (
+    IgnoreSet,
+    compile_ignore,
+    log_ignored,
+    read_ignore_tokens,
+)
+from rxn_rebuild.profiling import profile_call, top_functions, write_collapsed
+from rxn_rebuild.structures import StructureLookup, add_batch_structures
+from rxn_rebuild.stats import (
+    MemoryBudgetError,
+    format_size,
+    load_budgeted_cache,
+    load_measured_cache,
+    parse_size,
+)
 from brs_utils import (
     build_args_parser,
     init as init_logger,
 )
-from rxn_rebuild.Args import add_arguments
+from rxn_rebuild.shm import (
+    attach_cache,
+    check_platform,
+    publish_cache,
+    unlink_cache,
+)
+from rxn_rebuild.Args import (
+    add_arguments,
+    add_batch_arguments,
+    add_diff_arguments,
+    add_merge_arguments,
+    add_profile_arguments,
+    add_shm_arguments,
+    add_stats_arguments,
+)
 from rxn_rebuild._version import __version__
 from rr_cache import rrCache
 from logging import (
@@ -16,8 +57,15 @@ from colored import (
     fg as c_fg,
 )
 
+from json import (
+    dump as json_dump,
+    load as json_load,
+)
 from typing import (
+    Callable,
     Dict,
+    List,
+    Tuple,
 )
 
 
@@ -33,14 +81,16 @@ def disable_rdkit_logging():
     rkrb.DisableLog("rdApp.error")
 
 
-def entry_point():
+def init_cli(
+    prog: str, description: str, m_add_args: Callable, cli_args: List[str] = None
+) -> Tuple:
     parser = build_args_parser(
-        prog="rxn_rebuild",
+        prog=prog,
         version=__version__,
-        description="Rebuild full reaction from reaction rule",
-        m_add_args=add_arguments,
+        description=description,
+        m_add_args=m_add_args,
     )
-    args = parser.parse_args()
+    args = parser.parse_args(cli_args)
     if args.log.lower() in ["silent", "quiet", "def_info"] or args.silent:
         disable_rdkit_logging()
 
@@ -48,12 +98,115 @@ def entry_point():
     if args.log_file != "":
         log_basicConfig(filename=args.log_file, encoding="utf-8")
 
+    return args, logger
+
+
+def load_cache(
+    args,
+    logger: Logger = getLogger(__name__),
+    shard: Tuple[int, int] = None,
+    info: Dict = None,
+):
+    if args.shm_name is not None:
+        if args.max_memory is not None:
+            logger.warning(
+                "--max-memory does not apply to a cache attached with --shm, ignored"
+            )
+        return attach_cache(args.shm_name, logger=logger)
+    if args.max_memory is not None or shard is not None:
+        return load_budgeted_cache_cli(args, logger, shard=shard, info=info)
+    return rrCache(cspace=args.cspace, interactive=False, logger=logger)
+
+
+def read_memory_report(args) -> Dict:
+    if args.memory_report is None:
+        return None
+    with open(args.memory_report, "r") as f:
+        return json_load(f)
+
+
+def load_budgeted_cache_cli(
+    args,
+    logger: Logger = getLogger(__name__),
+    shard: Tuple[int, int] = None,
+    info: Dict = None,
+):
+    try:
+        return load_budgeted_cache(
+            cspace=args.cspace,
+            max_memory=parse_size(args.max_memory) if args.max_memory else None,
+            estimates=read_memory_report(args),
+            shard=shard,
+            info=info,
+            logger=logger,
+        )
+    except MemoryBudgetError as e:
+        logger.error(str(e))
+        exit(1)
+
+
+def load_measured_cache_cli(args, logger: Logger = getLogger(__name__)) -> Tuple:
+    try:
+        return load_measured_cache(
+            cspace=args.cspace,
+            max_memory=parse_size(args.max_memory) if args.max_memory else None,
+            estimates=read_memory_report(args),
+            logger=logger,
+        )
+    except MemoryBudgetError as e:
+        logger.error(str(e))
+        exit(1)
+
+
+def open_store(
+    args, cache, logger: Logger = getLogger(__name__), fingerprint: str = None
+) -> ResultStore:
+    if args.store is None:
+        return None
+    return ResultStore(
+        args.store,
+        cache=cache,
+        cspace=args.cspace,
+        max_entries=args.store_max_entries,
+        fingerprint=fingerprint,
+        logger=logger,
+    )
+
+
+def load_cmpds_to_ignore(
+    args, cache, logger: Logger = getLogger(__name__)
+) -> IgnoreSet:
+    # Compiled once per run, patterns being resolved against the cache
+    try:
+        return compile_ignore(
+            read_ignore_tokens(args.to_ignore)
+            + [f"@{preset}" for preset in args.ignore_presets],
+            cache=cache,
+            logger=logger,
+        )
+    except ValueError as e:
+        logger.error(str(e))
+        exit(1)
+
+
+def entry_point():
+    # Sub-commands are dispatched on the first argument,
+    # the default command being the completion of a single transformation
+    if len(argv) > 1 and argv[1] in COMMANDS:
+        return COMMANDS[argv[1]](argv[2:])
+
+    args, logger = init_cli(
+        prog="rxn_rebuild",
+        description="Rebuild full reaction from reaction rule",
+        m_add_args=add_arguments,
+    )
+
     # cache = rrCache(
     #     attrs=['rr_reactions', 'template_reactions', 'cid_strc'],
     #     logger=logger
     # )
 
-    cache = rrCache(cspace=args.cspace, interactive=False, logger=logger)
+    cache = load_cache(args, logger)
 
     msg_rr = "{color}{typo}Reaction Rule\n   |- ID:{rst} {rr_id}"
     if args.tmpl_rxn_id is not None:
@@ -76,21 +229,42 @@ def entry_point():
         )
     )
 
-    if args.to_ignore:
-        # One single line with compounds to ignore, separated by commas
-        with open(args.to_ignore, "r") as f:
-            cmpds_to_ignore = f.read().strip().split(",")
-    else:
-        cmpds_to_ignore = []
+    cmpds_to_ignore = load_cmpds_to_ignore(args, cache, logger)
 
-    completed_transfos = rebuild_rxn(
-        cache=cache,
-        rxn_rule_id=args.rxn_rule_id,
-        transfo=args.transfo,
-        tmpl_rxn_id=args.tmpl_rxn_id,
-        cmpds_to_ignore=cmpds_to_ignore,
-        logger=logger,
-    )
+    store = open_store(args, cache, logger)
+    status = {}
+    try:
+        completed_transfos = rebuild_rxn(
+            cache=cache,
+            rxn_rule_id=args.rxn_rule_id,
+            transfo=args.transfo,
+            tmpl_rxn_id=args.tmpl_rxn_id,
+            cmpds_to_ignore=cmpds_to_ignore,
+            store=store,
+            deadline=args.deadline,
+            max_templates=args.max_templates,
+            status=status,
+            logger=logger,
+        )
+    except TransfoParseError as e:
+        logger.error(str(e))
+        exit(1)
+    finally:
+        if store is not None:
+            store.close()
+    log_ignored(cmpds_to_ignore, logger=logger)
+
+    if status.get("partial"):
+        logger.warning(
+            f"   |- Partial result: {status['skipped']} template reactions skipped (--deadline/--max-templates)"
+        )
+
+    if args.structures is not None:
+        add_batch_structures(
+            [{"results": completed_transfos}],
+            StructureLookup(cache, args.structures, logger=logger),
+            logger=logger,
+        )
 
     print_results(completed_transfos, logger)
 
@@ -123,42 +297,64 @@ def entry_point():
 
 def print_results(transfo: Dict, logger: Logger = getLogger(__name__)):
     for tmpl_rxn_id in transfo.keys():
-        if "full_transfo" in transfo[tmpl_rxn_id]:
-            _transfo = (
-                f" {transfo[tmpl_rxn_id]['sep_cmpd']} ".join(
-                    [
-                        f"{coeff} {cmpd}"
-                        for cmpd, coeff in transfo[tmpl_rxn_id]["full_transfo"][
-                            "left"
-                        ].items()
-                    ]
-                )
-                + f" {transfo[tmpl_rxn_id]['sep_side']} "
-                + f" {transfo[tmpl_rxn_id]['sep_cmpd']} ".join(
-                    [
-                        f"{coeff} {cmpd}"
-                        for cmpd, coeff in transfo[tmpl_rxn_id]["full_transfo"][
-                            "right"
-                        ].items()
-                    ]
-                )
+        _transfo = (
+            f" {transfo[tmpl_rxn_id]['sep_cmpd']} ".join(
+                [
+                    f"{coeff} {cmpd}"
+                    for cmpd, coeff in transfo[tmpl_rxn_id]["full_transfo"][
+                        "left"
+                    ].items()
+                ]
+            )
+            + f" {transfo[tmpl_rxn_id]['sep_side']} "
+            + f" {transfo[tmpl_rxn_id]['sep_cmpd']} ".join(
+                [
+                    f"{coeff} {cmpd}"
+                    for cmpd, coeff in transfo[tmpl_rxn_id]["full_transfo"][
+                        "right"
+                    ].items()
+                ]
             )
+        )
+        logger.info(
+            "{typo}   |- completed from template reaction {rxn_id}: {rst}{transfo}".format(
+                rxn_id=tmpl_rxn_id,
+                transfo=_transfo,
+                typo=c_attr("bold"),
+                rst=c_attr("reset"),
+            )
+        )
+        # Structures, if added (--structures)
+        if transfo[tmpl_rxn_id].get("struct_transfo"):
             logger.info(
-                "{typo}   |- completed from template reaction {rxn_id}: {rst}{transfo}".format(
-                    rxn_id=tmpl_rxn_id,
-                    transfo=_transfo,
+                "{typo}         structure: {rst}{transfo}".format(
+                    transfo=transfo[tmpl_rxn_id]["struct_transfo"],
                     typo=c_attr("bold"),
                     rst=c_attr("reset"),
                 )
             )
-        else:
+        if transfo[tmpl_rxn_id].get("nostruct"):
             logger.info(
-                "{typo}   |- completed from template reaction {rxn_id}: {rst}".format(
-                    rxn_id=tmpl_rxn_id, typo=c_attr("bold"), rst=c_attr("reset")
+                "{typo}{color}         Unknown structure for some compounds{rst}".format(
+                    typo=c_attr("bold"), color=c_fg("white"), rst=c_attr("reset")
                 )
             )
+            for side in ["left", "right"]:
+                logger.info(
+                    "{rst}{typo}            |- {side}: {rst}{compounds}{rst}".format(
+                        side=side.upper(),
+                        compounds=" ".join(
+                            cmpd["cid"]
+                            for cmpd in transfo[tmpl_rxn_id]["nostruct"]
+                            if cmpd["side"] == side
+                        ),
+                        typo=c_attr("bold"),
+                        rst=c_attr("reset"),
+                    )
+                )
+        if transfo[tmpl_rxn_id].get("unconverted"):
             logger.info(
-                "{typo}{color}         Unknown structure for some compounds{rst}".format(
+                "{typo}{color}         Compounds given as SMILES, not converted{rst}".format(
                     typo=c_attr("bold"), color=c_fg("white"), rst=c_attr("reset")
                 )
             )
@@ -167,11 +363,9 @@ def print_results(transfo: Dict, logger: Logger = getLogger(__name__)):
                     "{rst}{typo}            |- {side}: {rst}{compounds}{rst}".format(
                         side=side.upper(),
                         compounds=" ".join(
-                            list(
-                                transfo[tmpl_rxn_id]["added_cmpds"][
-                                    side + "_nostruct"
-                                ].keys()
-                            )
+                            cmpd["smiles"]
+                            for cmpd in transfo[tmpl_rxn_id]["unconverted"]
+                            if cmpd["side"] == side
                         ),
                         typo=c_attr("bold"),
                         rst=c_attr("reset"),
@@ -179,5 +373,306 @@ def print_results(transfo: Dict, logger: Logger = getLogger(__name__)):
                 )
 
 
+def batch_entry_point(cli_args: List[str] = None):
+    args, logger = init_cli(
+        prog="rxn_rebuild batch",
+        description="Rebuild full reactions from a batch of reaction rules and transformations",
+        m_add_args=add_batch_arguments,
+        cli_args=cli_args,
+    )
+
+    shard = None
+    if args.shard is not None:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            logger.error(str(e))
+            exit(1)
+    # Only the rules owned by the shard are kept, each cache attribute being
+    # restricted as soon as loaded (a shared cache is used as is)
+    info = {} if args.store is not None else None
+    cache = load_cache(args, logger, shard=shard, info=info)
+    cmpds_to_ignore = load_cmpds_to_ignore(args, cache, logger)
+    # Results are stored against the whole cache data, whatever the shard
+    store = open_store(
+        args, cache, logger, fingerprint=info.get("fingerprint") if info else None
+    )
+
+    try:
+        n = run_batch(
+            infile=args.infile,
+            outfile=args.outfile,
+            cache=cache,
+            cmpds_to_ignore=cmpds_to_ignore,
+            cspace_type=args.cspace_type,
+            shard=shard,
+            resume=args.resume,
+            checkpoint_every=args.checkpoint_every,
+            store=store,
+            bulk_parse=args.bulk_parse,
+            plan=args.plan,
+            chunk_size=args.chunk_size,
+            structures=args.structures,
+            logger=logger,
+        )
+    except JournalError as e:
+        logger.error(str(e))
+        exit(1)
+    finally:
+        if store is not None:
+            store.close()
+    logger.info(
+        "{color}{typo}Batch\n   |- {n} records written to:{rst} {outfile}".format(
+            n=n,
+            outfile=args.outfile,
+            color=c_fg("white"),
+            typo=c_attr("bold"),
+            rst=c_attr("reset"),
+        )
+    )
+
+
+def merge_entry_point(cli_args: List[str] = None):
+    args, logger = init_cli(
+        prog="rxn_rebuild merge",
+        description="Merge the outputs of a sharded batch run, in input order",
+        m_add_args=add_merge_arguments,
+        cli_args=cli_args,
+    )
+
+    try:
+        n = merge_shards(args.shard_files, args.outfile, logger=logger)
+    except ValueError as e:
+        logger.error(str(e))
+        exit(1)
+    logger.info(
+        "{color}{typo}Merge\n   |- {n} records written to:{rst} {outfile}".format(
+            n=n,
+            outfile=args.outfile,
+            color=c_fg("white"),
+            typo=c_attr("bold"),
+            rst=c_attr("reset"),
+        )
+    )
+
+
+def stats_entry_point(cli_args: List[str] = None):
+    args, logger = init_cli(
+        prog="rxn_rebuild stats",
+        description="Report the memory footprint of each attribute of the cache",
+        m_add_args=add_stats_arguments,
+        cli_args=cli_args,
+    )
+
+    stats = load_measured_cache_cli(args, logger)[1]
+
+    logger.info(
+        "{color}{typo}Chemical space {cspace}{rst}".format(
+            cspace=args.cspace,
+            color=c_fg("white"),
+            typo=c_attr("bold"),
+            rst=c_attr("reset"),
+        )
+    )
+    for attr, attr_stats in stats.items():
+        logger.info(
+            "{typo}   |- {attr}:{rst} {entries} entries, {deep_size} (deep size), {traced} (traced), {rss} (RSS)".format(
+                attr=attr,
+                entries=attr_stats["entries"],
+                deep_size=format_size(attr_stats["deep_size"]),
+                traced=format_size(attr_stats["traced"]),
+                rss=(
+                    format_size(attr_stats["rss"])
+                    if attr_stats["rss"] is not None
+                    else "n/a"
+                ),
+                typo=c_attr("bold"),
+                rst=c_attr("reset"),
+            )
+        )
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json_dump(stats, f, indent=4)
+
+
+def shm_entry_point(cli_args: List[str] = None):
+    args, logger = init_cli(
+        prog="rxn_rebuild shm-publish",
+        description="Publish a chemical space into shared memory, once per node",
+        m_add_args=add_shm_arguments,
+        cli_args=cli_args,
+    )
+
+    if args.unlink:
+        unlink_cache(args.shm_name, logger=logger)
+        logger.info(f"Shared memory '{args.shm_name}' removed")
+        return
+
+    try:
+        check_platform()
+    except OSError as e:
+        logger.error(str(e))
+        exit(1)
+    cache = rrCache(cspace=args.cspace, interactive=False, logger=logger)
+    publish_cache(cache, args.shm_name, logger=logger)
+    logger.info(
+        "{color}{typo}Chemical space {cspace}\n   |- published in shared memory:{rst} {name}".format(
+            cspace=args.cspace,
+            name=args.shm_name,
+            color=c_fg("white"),
+            typo=c_attr("bold"),
+            rst=c_attr("reset"),
+        )
+    )
+
+
+def diff_entry_point(cli_args: List[str] = None):
+    args, logger = init_cli(
+        prog="rxn_rebuild diff-spaces",
+        description="List the reaction rules and template reactions that changed between two chemical spaces, and migrate stored results",
+        m_add_args=add_diff_arguments,
+        cli_args=cli_args,
+    )
+
+    old_cache = rrCache(cspace=args.old_cspace, interactive=False, logger=logger)
+    new_cache = rrCache(cspace=args.new_cspace, interactive=False, logger=logger)
+    diff = diff_spaces(old_cache, new_cache, logger=logger)
+
+    logger.info(
+        "{color}{typo}Chemical spaces {old} -> {new}{rst}".format(
+            old=args.old_cspace,
+            new=args.new_cspace,
+            color=c_fg("white"),
+            typo=c_attr("bold"),
+            rst=c_attr("reset"),
+        )
+    )
+    for attr in ["rr_reactions", "template_reactions"]:
+        logger.info(
+            "{typo}   |- {attr}:{rst} {added} added, {removed} removed, {changed} changed".format(
+                attr=attr,
+                added=len(diff[attr]["added"]),
+                removed=len(diff[attr]["removed"]),
+                changed=len(diff[attr]["changed"]),
+                typo=c_attr("bold"),
+                rst=c_attr("reset"),
+            )
+        )
+    logger.info(
+        "{typo}   |- affected reaction rules:{rst} {n}".format(
+            n=len(diff["affected_rules"]), typo=c_attr("bold"), rst=c_attr("reset")
+        )
+    )
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json_dump(diff, f, indent=4)
+
+    if args.store is not None:
+        kept, dropped = migrate_results(
+            args.store,
+            old_cspace=args.old_cspace,
+            old_fingerprint=cache_fingerprint(old_cache),
+            new_cspace=args.new_cspace,
+            new_fingerprint=cache_fingerprint(new_cache),
+            affected_rules=diff["affected_rules"],
+            logger=logger,
+        )
+        logger.info(
+            "{typo}   |- stored results:{rst} {kept} reused, {dropped} to recompute".format(
+                kept=kept, dropped=dropped, typo=c_attr("bold"), rst=c_attr("reset")
+            )
+        )
+
+
+def profile_entry_point(cli_args: List[str] = None):
+    args, logger = init_cli(
+        prog="rxn_rebuild profile",
+        description="Profile the cache load and the completion of a batch input, separately",
+        m_add_args=add_profile_arguments,
+        cli_args=cli_args,
+    )
+
+    cache, load_profile = profile_call(
+        lambda: load_cache(args, logger),
+        mode=args.mode,
+        interval=args.interval,
+        logger=logger,
+    )
+    cmpds_to_ignore = load_cmpds_to_ignore(args, cache, logger)
+    store = open_store(args, cache, logger)
+    try:
+        n, complete_profile = profile_call(
+            lambda: sum(
+                1
+                for _ in rebuild_batch(
+                    rows=read_rows(args.infile),
+                    cache=cache,
+                    cmpds_to_ignore=cmpds_to_ignore,
+                    cspace_type=args.cspace_type,
+                    store=store,
+                    bulk_parse=args.bulk_parse,
+                    plan=args.plan,
+                    chunk_size=args.chunk_size,
+                    structures=args.structures,
+                    logger=logger,
+                )
+            ),
+            mode=args.mode,
+            interval=args.interval,
+            logger=logger,
+        )
+    finally:
+        if store is not None:
+            store.close()
+
+    summary = {"mode": args.mode, "n_records": n}
+    for phase, profile in [("load", load_profile), ("complete", complete_profile)]:
+        filename = f"{args.output_prefix}.{phase}.collapsed"
+        write_collapsed(profile["stacks"], filename)
+        top = top_functions(profile["stacks"], args.top)
+        summary[phase] = {
+            "wall": profile["wall"],
+            "unit": profile["unit"],
+            "collapsed": filename,
+            "top": top,
+        }
+        logger.info(
+            "{color}{typo}Profile: {phase}{rst} ({wall:.3f}s, {mode})".format(
+                phase=phase,
+                wall=profile["wall"],
+                mode=args.mode,
+                color=c_fg("white"),
+                typo=c_attr("bold"),
+                rst=c_attr("reset"),
+            )
+        )
+        for func in top:
+            logger.info(
+                "{typo}   |- {self:>10} self {total:>10} total ({unit}):{rst} {function}".format(
+                    unit=profile["unit"],
+                    typo=c_attr("bold"),
+                    rst=c_attr("reset"),
+                    **func,
+                )
+            )
+    with open(f"{args.output_prefix}.summary.json", "w") as f:
+        json_dump(summary, f, indent=4)
+    logger.info(
+        "{typo}Collapsed stacks and summary written to:{rst} {prefix}.*".format(
+            prefix=args.output_prefix, typo=c_attr("bold"), rst=c_attr("reset")
+        )
+    )
+
+
+COMMANDS = {
+    "batch": batch_entry_point,
+    "merge": merge_entry_point,
+    "stats": stats_entry_point,
+    "shm-publish": shm_entry_point,
+    "diff-spaces": diff_entry_point,
+    "profile": profile_entry_point,
+}
+
+
 if __name__ == "__main__":
     entry_point()
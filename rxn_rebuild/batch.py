@@ -0,0 +1,601 @@
+from logging import (
+    Logger,
+    getLogger,
+)
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Sequence,
+    Tuple,
+)
+from collections import Counter
+from heapq import merge as heap_merge
+from itertools import islice
+from json import dumps, loads
+from os import (
+    fsync,
+    remove,
+    replace,
+    truncate,
+    path as os_path,
+)
+from zlib import crc32
+from rr_cache import rrCache
+from .fingerprint import cache_fingerprint, file_fingerprint
+from .ignore import log_ignored
+from .journal import Journal, JournalError
+from .parser import parse_transfos
+from .planner import rebuild_planned, log_group_stats
+from .structures import StructureLookup, add_batch_structures
+from .rxn_rebuild import (
+    rebuild_rxn,
+    build_rule_index,
+    check_rule_ids,
+    ERR_NO_RESULT,
+    ERR_PARSE,
+    TransfoParseError,
+)
+
+if TYPE_CHECKING:
+    from .store import ResultStore
+
+
+def read_rows(filename: str, sep: str = "\t") -> Iterator[Tuple[str, str, str]]:
+    """
+    Read transformations to complete from a batch file.
+
+    Each line holds a reaction rule ID, a transformation and, optionally,
+    a template reaction ID, separated by 'sep'. Empty lines and lines
+    starting with '#' are skipped.
+
+    Parameters
+    ----------
+    filename: str
+        Batch input file.
+    sep: str
+        Column separator.
+
+    Returns
+    -------
+    rows: Iterator[Tuple[str, str, str]]
+        (rxn_rule_id, transfo, tmpl_rxn_id) tuples, tmpl_rxn_id being None
+        when not provided.
+    """
+    with open(filename, "r") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.strip() == "" or line.startswith("#"):
+                continue
+            row = line.split(sep)
+            tmpl_rxn_id = row[2] if len(row) > 2 and row[2] != "" else None
+            yield row[0], row[1], tmpl_rxn_id
+
+
+class DictCache:
+    """
+    Cache made of plain dictionaries, to be used in place of rrCache.
+    """
+
+    def __init__(self, data: Dict[str, Dict]):
+        self.data = data
+
+    def get(self, attr: str) -> Dict:
+        return self.data[attr]
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """
+    Parse a shard specification 'i/N', i being in [0, N).
+    """
+    try:
+        i, n = (int(x) for x in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{shard}', expected 'i/N'")
+    if n < 1 or not 0 <= i < n:
+        raise ValueError(f"Invalid shard '{shard}', expected 0 <= i < N")
+    return i, n
+
+
+def shard_of(rxn_rule_id: str, n_shards: int) -> int:
+    """
+    Shard owning a reaction rule, stable across runs and machines.
+    """
+    return crc32(rxn_rule_id.encode("utf-8")) % n_shards
+
+
+def shard_attr(
+    attr: str, data: Dict, shard: Tuple[int, int], rr_reactions: Dict = None
+) -> Dict:
+    """
+    Restrict one cache attribute to a shard: reaction rules owned by the
+    shard, template reactions of these rules ('rr_reactions' being already
+    restricted), other attributes being kept whole.
+    """
+    i, n = shard
+    if attr == "rr_reactions":
+        return {
+            rxn_rule_id: tmpl_rxns
+            for rxn_rule_id, tmpl_rxns in data.items()
+            if shard_of(rxn_rule_id, n) == i
+        }
+    if attr == "template_reactions":
+        tmpl_rxn_ids = {
+            tmpl_rxn_id
+            for tmpl_rxns in rr_reactions.values()
+            for tmpl_rxn_id in tmpl_rxns
+        }
+        return {
+            tmpl_rxn_id: tmpl_rxn
+            for tmpl_rxn_id, tmpl_rxn in data.items()
+            if tmpl_rxn_id in tmpl_rxn_ids
+        }
+    return data
+
+
+def shard_cache(
+    cache: "rrCache", shard: Tuple[int, int], logger: Logger = getLogger(__name__)
+) -> DictCache:
+    """
+    Restrict a cache to the reaction rules owned by a shard, and to the
+    template reactions these rules come from.
+    """
+    rr_reactions = shard_attr("rr_reactions", cache.get("rr_reactions"), shard)
+    template_reactions = shard_attr(
+        "template_reactions", cache.get("template_reactions"), shard, rr_reactions
+    )
+    logger.debug(
+        f"Shard {shard[0]}/{shard[1]}: {len(rr_reactions)} reaction rules, {len(template_reactions)} template reactions"
+    )
+    return DictCache(
+        {
+            "rr_reactions": rr_reactions,
+            "template_reactions": template_reactions,
+            "cid_strc": cache.get("cid_strc"),
+        }
+    )
+
+
+def chunks(rows: Iterable[Sequence], chunk_size: int) -> Iterator[List]:
+    """
+    Read rows by chunks of (index, row) tuples.
+    """
+    it = enumerate(rows)
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def rebuild_row(
+    row: int,
+    rxn_rule_id: str,
+    transfo: str,
+    tmpl_rxn_id: str,
+    cache: "rrCache",
+    rule_index: Dict[str, FrozenSet[str]],
+    cmpds_to_ignore: List[str] = [],
+    cspace_type: str = "rr2026",
+    store: "ResultStore" = None,
+    trans_input: Dict = None,
+    parse_failed: bool = False,
+    logger: Logger = getLogger(__name__),
+) -> Dict:
+    """
+    Complete the transformation of one batch row into a record,
+    'trans_input' being the transformation already parsed, if any, and
+    'parse_failed' telling that it has been parsed, unsuccessfully.
+    """
+    results = {}
+    error = check_rule_ids(rxn_rule_id, tmpl_rxn_id, rule_index)
+    if error is None and parse_failed:
+        error = ERR_PARSE
+    if error is None:
+        try:
+            results = rebuild_rxn(
+                rxn_rule_id=rxn_rule_id,
+                transfo=transfo,
+                tmpl_rxn_id=tmpl_rxn_id,
+                cache=cache,
+                cmpds_to_ignore=cmpds_to_ignore,
+                cspace_type=cspace_type,
+                store=store,
+                trans_input=trans_input,
+                logger=logger,
+            )
+        except TransfoParseError as e:
+            logger.debug(f"   |- row {row}: {e}")
+            error = ERR_PARSE
+        else:
+            if results == {}:
+                error = ERR_NO_RESULT
+    return {
+        "row": row,
+        "rxn_rule_id": rxn_rule_id,
+        "transfo": transfo,
+        "tmpl_rxn_id": tmpl_rxn_id,
+        "error": error,
+        "results": results,
+    }
+
+
+def rebuild_batch(
+    rows: Iterable[Tuple[str, str, str]],
+    cache: "rrCache",
+    cmpds_to_ignore: List[str] = [],
+    cspace_type: str = "rr2026",
+    shard: Tuple[int, int] = None,
+    start_row: int = 0,
+    store: "ResultStore" = None,
+    bulk_parse: bool = False,
+    plan: bool = False,
+    chunk_size: int = 1000,
+    structures: str = None,
+    summary: Dict = None,
+    logger: Logger = getLogger(__name__),
+) -> Iterator[Dict]:
+    """
+    Complete a batch of transformations, one record per input row.
+
+    Rows with unknown reaction rule or template reaction IDs are rejected
+    before any parsing and flagged with an error code. Errors are reported
+    once, in aggregate, when the batch is exhausted.
+
+    Parameters
+    ----------
+    rows: Iterable[Tuple[str, str, str]]
+        (rxn_rule_id, transfo, tmpl_rxn_id) tuples.
+    cache: rrCache
+        Loaded cache.
+    cmpds_to_ignore: List[str]
+        List of compounds to ignore.
+    cspace_type: str
+        Type of chemical space ('legacy' or not).
+    shard: Tuple[int, int]
+        (i, N) to process only the rows whose reaction rule is owned
+        by shard i out of N.
+    start_row: int
+        Index of the first row to process, previous ones being skipped.
+    store: ResultStore
+        Persistent result store to look up before completing, and to fill.
+    bulk_parse: bool
+        Parse the transformations of each chunk of rows at once
+        (see parser.parse_transfos) rather than one by one.
+    plan: bool
+        Group the rows of each chunk by reaction rule, to resolve each rule
+        once per group (see planner.rebuild_planned).
+    chunk_size: int
+        Number of rows read at once.
+    structures: str
+        Format ('smiles', 'inchi' or 'inchikey') of the structures to add to
+        completed transformations, the compounds of each chunk being looked
+        up at once (see structures.add_batch_structures).
+    summary: Dict
+        If provided, filled with 'n_rows', 'n_records', 'errors' and, if
+        'plan', 'groups' statistics once the batch is exhausted.
+    logger : Logger
+        The logger object.
+
+    Returns
+    -------
+    records: Iterator[Dict]
+        One record per input row (owned by the shard, if any) with 'row',
+        'rxn_rule_id', 'transfo', 'tmpl_rxn_id', 'error' and 'results' keys.
+    """
+    rule_index = build_rule_index(cache)
+    lookup = None
+    if structures is not None:
+        lookup = StructureLookup(cache, structures, logger=logger)
+    errors = Counter()
+    group_stats = {}
+    n_rows = 0
+    n_records = 0
+
+    for chunk in chunks(rows, chunk_size):
+        n_rows += len(chunk)
+        chunk = [
+            (i, row)
+            for i, row in chunk
+            if i >= start_row
+            and (shard is None or shard_of(row[0], shard[1]) == shard[0])
+        ]
+        trans_inputs = {}
+        parse_failed = set()
+        if bulk_parse:
+            # Unknown IDs are not parsed
+            to_parse = [
+                (i, row[1])
+                for i, row in chunk
+                if check_rule_ids(row[0], row[2], rule_index) is None
+            ]
+            parsed = zip(
+                (i for i, _ in to_parse),
+                parse_transfos((transfo for _, transfo in to_parse), logger),
+            )
+            # Failed ones are flagged, not parsed again
+            for i, trans_input in parsed:
+                if trans_input is None:
+                    parse_failed.add(i)
+                else:
+                    trans_inputs[i] = trans_input
+        if plan:
+            records = rebuild_planned(
+                chunk,
+                cache=cache,
+                rule_index=rule_index,
+                cmpds_to_ignore=cmpds_to_ignore,
+                cspace_type=cspace_type,
+                store=store,
+                trans_inputs=trans_inputs,
+                parse_failed=parse_failed,
+                group_stats=group_stats,
+                logger=logger,
+            )
+        else:
+            records = (
+                rebuild_row(
+                    i,
+                    rxn_rule_id,
+                    transfo,
+                    tmpl_rxn_id,
+                    cache=cache,
+                    rule_index=rule_index,
+                    cmpds_to_ignore=cmpds_to_ignore,
+                    cspace_type=cspace_type,
+                    store=store,
+                    trans_input=trans_inputs.get(i),
+                    parse_failed=i in parse_failed,
+                    logger=logger,
+                )
+                for i, (rxn_rule_id, transfo, tmpl_rxn_id) in chunk
+            )
+        if lookup is not None:
+            records = add_batch_structures(list(records), lookup, logger)
+        for record in records:
+            n_records += 1
+            if record["error"] is not None:
+                errors[record["error"]] += 1
+            yield record
+
+    if summary is not None:
+        summary.update(n_rows=n_rows, n_records=n_records, errors=dict(errors))
+        if plan:
+            summary["groups"] = {
+                key: value for key, value in group_stats.items() if key != "_pairs"
+            }
+    log_errors_summary(errors, n_records, logger)
+    log_group_stats(group_stats, logger)
+    log_ignored(cmpds_to_ignore, logger=logger)
+    if lookup is not None:
+        logger.debug(
+            f"   |- structures: {len(lookup)} compounds looked up, {lookup.hits} reused"
+        )
+
+
+def log_errors_summary(
+    errors: Counter, n_rows: int, logger: Logger = getLogger(__name__)
+) -> None:
+    if not errors:
+        logger.info(f"   |- {n_rows} rows processed, no error")
+        return
+    logger.warning(
+        f"   |- {n_rows} rows processed, {sum(errors.values())} in error: "
+        + ", ".join(f"{code}={count}" for code, count in sorted(errors.items()))
+    )
+
+
+def run_batch(
+    infile: str,
+    outfile: str,
+    cache: "rrCache",
+    cmpds_to_ignore: List[str] = [],
+    cspace_type: str = "rr2026",
+    shard: Tuple[int, int] = None,
+    resume: bool = False,
+    checkpoint_every: int = 1000,
+    store: "ResultStore" = None,
+    bulk_parse: bool = False,
+    plan: bool = False,
+    chunk_size: int = 1000,
+    structures: str = None,
+    logger: Logger = getLogger(__name__),
+) -> int:
+    """
+    Complete a batch file into a JSON Lines output file.
+
+    With 'resume', progress is journaled into '<outfile>.journal' and synced
+    to disk every 'checkpoint_every' records. If the journal already exists,
+    the run restarts after the last checkpoint, appending to the output file,
+    unless the input file, the cache data or the options changed.
+
+    Returns
+    -------
+    n: int
+        Number of records in the output file.
+    """
+    journal = None
+    start_row, n_done, out_size = 0, 0, 0
+    if resume:
+        journal = Journal(
+            outfile + ".journal",
+            {
+                "input": file_fingerprint(infile),
+                "cache": cache_fingerprint(cache),
+                "cspace_type": cspace_type,
+                "cmpds_to_ignore": sorted(cmpds_to_ignore),
+                "shard": list(shard) if shard is not None else None,
+                "structures": structures,
+            },
+            logger=logger,
+        )
+        start_row, n_done, out_size = journal.open()
+        if journal.done:
+            journal.close()
+            logger.info(f"   |- {outfile} already complete")
+            return n_done
+
+    if out_size > 0 and (
+        not os_path.exists(outfile) or os_path.getsize(outfile) < out_size
+    ):
+        journal.close()
+        raise JournalError(
+            f"Cannot resume from {journal.filename}: {outfile} is missing or shorter than at the last checkpoint, remove the journal to start over"
+        )
+
+    mode = "wb"
+    if start_row > 0 or (journal is not None and os_path.exists(outfile)):
+        # Drop records written after the last checkpoint
+        truncate(outfile, out_size)
+        mode = "ab"
+
+    summary = {}
+    n = n_done
+    with open(outfile, mode) as f:
+        for record in rebuild_batch(
+            rows=read_rows(infile),
+            cache=cache,
+            cmpds_to_ignore=cmpds_to_ignore,
+            cspace_type=cspace_type,
+            shard=shard,
+            start_row=start_row,
+            store=store,
+            bulk_parse=bulk_parse,
+            plan=plan,
+            chunk_size=chunk_size,
+            structures=structures,
+            summary=summary,
+            logger=logger,
+        ):
+            f.write((dumps(record) + "\n").encode("utf-8"))
+            n += 1
+            if journal is not None and (n - n_done) % checkpoint_every == 0:
+                f.flush()
+                fsync(f.fileno())
+                journal.checkpoint(record["row"] + 1, n, f.tell())
+        f.flush()
+        fsync(f.fileno())
+
+    if shard is not None:
+        write_shard_footer(
+            outfile,
+            shard,
+            {
+                "n_rows": summary["n_rows"],
+                "n_records": n,
+                "input": file_fingerprint(infile),
+            },
+        )
+    if journal is not None:
+        journal.checkpoint(summary["n_rows"], n, os_path.getsize(outfile), done=True)
+        journal.close()
+
+    return n
+
+
+def write_shard_footer(outfile: str, shard: Tuple[int, int], summary: Dict) -> None:
+    """
+    Close a shard output with a footer record, marking it as complete, along
+    with the fingerprint of the input file ('input' in summary).
+    """
+    with open(outfile, "a") as f:
+        f.write(
+            dumps(
+                {
+                    "shard": shard[0],
+                    "n_shards": shard[1],
+                    "n_rows": summary["n_rows"],
+                    "n_records": summary["n_records"],
+                    "input": summary.get("input"),
+                }
+            )
+            + "\n"
+        )
+
+
+def read_shard_footer(filename: str) -> Dict:
+    """
+    Read the footer of a shard output.
+
+    Returns
+    -------
+    footer: Dict
+        Footer record, None if the shard output is not complete.
+    """
+    footer = None
+    with open(filename, "r") as f:
+        for line in f:
+            record = loads(line)
+            footer = record if "n_shards" in record else None
+    return footer
+
+
+def _iter_records(filename: str) -> Iterator[Dict]:
+    with open(filename, "r") as f:
+        for line in f:
+            record = loads(line)
+            if "n_shards" not in record:
+                yield record
+
+
+def merge_shards(
+    filenames: List[str], outfile: str, logger: Logger = getLogger(__name__)
+) -> int:
+    """
+    Merge shard outputs into one file, in input order. Every shard must be
+    complete and present exactly once, and together cover every input row.
+
+    Returns
+    -------
+    n: int
+        Number of records written.
+    """
+    footers = {}
+    for filename in filenames:
+        footer = read_shard_footer(filename)
+        if footer is None:
+            raise ValueError(f"{filename}: incomplete shard output (no footer)")
+        if footer["shard"] in footers:
+            raise ValueError(
+                f"{filename}: shard {footer['shard']}/{footer['n_shards']} given twice"
+            )
+        footers[footer["shard"]] = footer
+    n_shards = {footer["n_shards"] for footer in footers.values()}
+    n_rows = {footer["n_rows"] for footer in footers.values()}
+    inputs = {footer.get("input") for footer in footers.values()}
+    if len(n_shards) != 1 or len(n_rows) != 1 or len(inputs) != 1:
+        raise ValueError("Shard outputs come from different runs")
+    n_shards, n_rows = n_shards.pop(), n_rows.pop()
+    missing = sorted(set(range(n_shards)) - set(footers))
+    if missing:
+        raise ValueError(f"Missing shard(s): {', '.join(map(str, missing))}")
+
+    # Written aside and renamed once every row has been checked,
+    # not to leave a truncated output behind
+    tmpfile = outfile + ".tmp"
+    n = 0
+    try:
+        with open(tmpfile, "w") as f:
+            for record in heap_merge(
+                *(_iter_records(filename) for filename in filenames),
+                key=lambda record: record["row"],
+            ):
+                if record["row"] != n:
+                    raise ValueError(
+                        f"Row {n} {'duplicated' if record['row'] < n else 'missing'} in shard outputs"
+                    )
+                f.write(dumps(record) + "\n")
+                n += 1
+        if n != n_rows:
+            raise ValueError(f"Rows {n} to {n_rows - 1} missing in shard outputs")
+    except BaseException:
+        if os_path.exists(tmpfile):
+            remove(tmpfile)
+        raise
+    replace(tmpfile, outfile)
+    logger.debug(f"{len(filenames)} shards merged, {n} records")
+
+    return n
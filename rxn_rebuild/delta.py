@@ -0,0 +1,81 @@
+from logging import (
+    Logger,
+    getLogger,
+)
+from typing import Dict, List, Tuple
+from rr_cache import rrCache
+from .fingerprint import entry_fingerprint
+
+# Cache attributes completed transformations depend on
+DELTA_ATTRS = ("rr_reactions", "template_reactions")
+
+
+def space_fingerprints(
+    cache: "rrCache", attrs: Tuple[str] = DELTA_ATTRS
+) -> Dict[str, Dict]:
+    """
+    Fingerprint of every entry (reaction rule, template reaction) of a cache.
+    """
+    return {
+        attr: {key: entry_fingerprint(entry) for key, entry in cache.get(attr).items()}
+        for attr in attrs
+    }
+
+
+def diff_fingerprints(old: Dict[str, str], new: Dict[str, str]) -> Dict[str, List]:
+    """
+    Entries 'added', 'removed' and 'changed' between two sets of fingerprints.
+    """
+    return {
+        "added": sorted(key for key in new if key not in old),
+        "removed": sorted(key for key in old if key not in new),
+        "changed": sorted(key for key in old if key in new and old[key] != new[key]),
+    }
+
+
+def diff_spaces(
+    old_cache: "rrCache",
+    new_cache: "rrCache",
+    logger: Logger = getLogger(__name__),
+) -> Dict:
+    """
+    Differences between two releases of the cache data.
+
+    Parameters
+    ----------
+    old_cache: rrCache
+        Cache of the old release.
+    new_cache: rrCache
+        Cache of the new release.
+    logger : Logger
+        The logger object.
+
+    Returns
+    -------
+    diff: Dict
+        'added', 'removed' and 'changed' entries for each of 'rr_reactions'
+        and 'template_reactions', and the 'affected_rules': reaction rules
+        removed, changed or completed with a template reaction removed or
+        changed, whose completed transformations may differ.
+    """
+    old = space_fingerprints(old_cache)
+    new = space_fingerprints(new_cache)
+    diff = {attr: diff_fingerprints(old[attr], new[attr]) for attr in DELTA_ATTRS}
+
+    tmpl_rxns = set(diff["template_reactions"]["removed"]) | set(
+        diff["template_reactions"]["changed"]
+    )
+    affected_rules = set(diff["rr_reactions"]["removed"]) | set(
+        diff["rr_reactions"]["changed"]
+    )
+    for rxn_rule_id, rxn_rules in old_cache.get("rr_reactions").items():
+        if rxn_rule_id not in affected_rules and not tmpl_rxns.isdisjoint(rxn_rules):
+            affected_rules.add(rxn_rule_id)
+    diff["affected_rules"] = sorted(affected_rules)
+
+    for attr in DELTA_ATTRS:
+        logger.debug(
+            f"   |- {attr}: "
+            + ", ".join(f"{len(keys)} {change}" for change, keys in diff[attr].items())
+        )
+    return diff
@@ -0,0 +1,51 @@
+from typing import Dict, Tuple
+from hashlib import sha256
+from json import dumps
+from rr_cache import rrCache
+from .shm import CACHE_ATTRS
+
+
+def entry_fingerprint(entry: Dict) -> str:
+    """
+    Fingerprint of one cache entry (reaction rule, template reaction...),
+    independent of the order of its keys.
+    """
+    return sha256(
+        dumps(entry, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+def cache_fingerprint(cache: "rrCache", attrs: Tuple[str] = CACHE_ATTRS) -> str:
+    """
+    Fingerprint of the data held by a cache, changing as soon as one entry
+    of one of the given attributes is added, removed or modified.
+    """
+    h = sha256()
+    for attr in attrs:
+        update_fingerprint(h, attr, cache.get(attr))
+    return h.hexdigest()
+
+
+def update_fingerprint(h: "sha256", attr: str, data: Dict) -> None:
+    """
+    Feed one cache attribute into a cache fingerprint (see cache_fingerprint),
+    for attributes to be fingerprinted one by one as they are loaded.
+    """
+    h.update(attr.encode("utf-8") + b"\0")
+    for key in sorted(data):
+        h.update(key.encode("utf-8") + b"\0")
+        h.update(
+            dumps(data[key], sort_keys=True, separators=(",", ":")).encode("utf-8")
+            + b"\0"
+        )
+
+
+def file_fingerprint(filename: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Fingerprint of the content of a file.
+    """
+    h = sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
@@ -0,0 +1,208 @@
+from logging import (
+    Logger,
+    getLogger,
+)
+from typing import Dict, Iterable, List, Tuple
+from collections import Counter
+from fnmatch import translate
+from re import compile as re_compile
+from rr_cache import rrCache
+
+# Named sets of compounds to ignore, referred to as '@name'
+PRESETS = {
+    "water": ("CHEBI:15377", "MNXM2", "WATER"),
+    "protons": ("CHEBI:15378", "MNXM1"),
+    # Cofactor pool of MetaNetX compounds
+    "mnx_cofactors": (
+        "MNXM01",
+        "MNXM1",
+        "MNXM2",
+        "MNXM3",
+        "MNXM4",
+        "MNXM5",
+        "MNXM6",
+        "MNXM7",
+        "MNXM8",
+        "MNXM9",
+        "MNXM10",
+        "MNXM11",
+        "MNXM12",
+        "MNXM13",
+        "MNXM14",
+        "MNXM15",
+        "MNXM16",
+        "MNXM17",
+        "MNXM19",
+        "MNXM24",
+        "MNXM27",
+        "MNXM30",
+        "MNXM31",
+        "MNXM33",
+        "MNXM35",
+        "MNXM36",
+        "MNXM38",
+        "MNXM39",
+        "MNXM43",
+        "MNXM45",
+        "MNXM49",
+        "MNXM51",
+        "MNXM56",
+        "MNXM57",
+        "MNXM58",
+        "MNXM80",
+        "MNXM95",
+        "MNXM107",
+        "MNXM111",
+        "MNXM119",
+        "MNXM121",
+        "MNXM128",
+        "MNXM137",
+        "MNXM149",
+        "MNXM163",
+        "MNXM169",
+        "MNXM178",
+        "MNXM196",
+        "MNXM208",
+        "MNXM220",
+        "MNXM228",
+        "MNXM230",
+        "MNXM255",
+        "MNXM330",
+        "MNXM537",
+        "MNXM579",
+        "MNXM632",
+        "MNXM652",
+        "MNXM653",
+        "MNXM724",
+        "MNXM796",
+        "MNXM833",
+        "MNXM924",
+        "MNXM925",
+        "MNXM996",
+        "MNXM1191",
+        "MNXM1231",
+        "MNXM1562",
+        "MNXM2229",
+        "MNXM2255",
+        "MNXM3568",
+        "MNXM3654",
+        "MNXM3673",
+        "MNXM4041",
+        "MNXM4505",
+        "MNXM5928",
+        "MNXM8975",
+        "MNXM8978",
+        "MNXM40414",
+        "MNXM53428",
+        "MNXM89582",
+        "MNXM92652",
+        "MNXM162231",
+    ),
+}
+
+
+class IgnoreSet(frozenset):
+    """
+    Compounds to ignore, compiled once per run, counting how many times
+    each compound has been ignored, once per completed transformation
+    (results reused from a result store are not counted).
+    """
+
+    def __new__(cls, cids: Iterable[str] = ()):
+        return super().__new__(cls, cids)
+
+    def __init__(self, cids: Iterable[str] = ()):
+        self.counts = Counter()
+
+    def __reduce__(self):
+        # Counts are per process
+        return (self.__class__, (list(self),))
+
+
+def read_ignore_tokens(filename: str) -> List[str]:
+    """
+    Read compounds to ignore from a file, separated by commas and/or newlines.
+    """
+    if not filename:
+        return []
+    with open(filename, "r") as f:
+        return [
+            token.strip() for line in f for token in line.split(",") if token.strip()
+        ]
+
+
+def _cache_cids(cache: "rrCache") -> Iterable[str]:
+    yield from cache.get("cid_strc")
+    # Compounds to add come from template reactions
+    for tmpl_rxn in cache.get("template_reactions").values():
+        for side in ("left", "right"):
+            yield from tmpl_rxn[side]
+
+
+def compile_ignore(
+    tokens: Iterable[str],
+    cache: "rrCache" = None,
+    presets: Dict[str, Tuple[str]] = PRESETS,
+    logger: Logger = getLogger(__name__),
+) -> IgnoreSet:
+    """
+    Compile compounds to ignore into a set, once per run.
+
+    Parameters
+    ----------
+    tokens: Iterable[str]
+        Compound IDs, '@name' presets and wildcard patterns (e.g. 'MNXM1*',
+        'CHEBI:1537?'), patterns being resolved against the compound IDs of
+        the cache.
+    cache: rrCache
+        Loaded cache, required if there are patterns.
+    presets: Dict[str, Tuple[str]]
+        Named sets of compounds.
+    logger : Logger
+        The logger object.
+
+    Returns
+    -------
+    cmpds_to_ignore: IgnoreSet
+        Compounds to ignore.
+    """
+    cids = set()
+    patterns = []
+    for token in tokens:
+        if token.startswith("@"):
+            if token[1:] not in presets:
+                raise ValueError(
+                    f"Unknown preset of compounds to ignore '{token[1:]}', expected one of {sorted(presets)}"
+                )
+            cids.update(presets[token[1:]])
+        elif any(c in token for c in "*?["):
+            patterns.append(token)
+        else:
+            cids.add(token)
+
+    if patterns:
+        if cache is None:
+            raise ValueError(
+                f"Patterns of compounds to ignore need a cache to be resolved: {patterns}"
+            )
+        regex = re_compile("|".join(translate(pattern) for pattern in patterns))
+        matched = {cid for cid in set(_cache_cids(cache)) if regex.match(cid)}
+        logger.debug(f"   |- {len(matched)} compounds to ignore matching {patterns}")
+        cids.update(matched)
+
+    return IgnoreSet(cids)
+
+
+def log_ignored(
+    cmpds_to_ignore: IgnoreSet, n: int = 10, logger: Logger = getLogger(__name__)
+) -> None:
+    """
+    Report how many times compounds have been ignored, once for the whole run.
+    """
+    counts = getattr(cmpds_to_ignore, "counts", None)
+    if not counts:
+        return
+    logger.info(
+        f"   |- {sum(counts.values())} compounds ignored ({len(counts)} distinct), most often: "
+        + ", ".join(f"{cid} ({count})" for cid, count in counts.most_common(n))
+    )
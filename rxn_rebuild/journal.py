@@ -0,0 +1,131 @@
+from logging import (
+    Logger,
+    getLogger,
+)
+from typing import Dict, Tuple
+from json import dumps, loads
+from os import (
+    fsync,
+    truncate,
+    path as os_path,
+)
+
+
+class JournalError(ValueError):
+    """
+    Raised when a run cannot be resumed from its journal.
+    """
+
+
+class JournalMismatchError(JournalError):
+    """
+    Raised when resuming a run whose input or chemical space changed.
+    """
+
+
+class Journal:
+    """
+    Progress journal of a batch run, stored next to its output.
+
+    The first line holds the fingerprints of the run (input file,
+    chemical space...), each following line a checkpoint with the range of
+    input rows completed since the previous one, the number of records and
+    the size of the output file at that time. The last checkpoint is flagged
+    with "done" once the run is over.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        fingerprints: Dict[str, str],
+        logger: Logger = getLogger(__name__),
+    ):
+        self.filename = filename
+        self.fingerprints = fingerprints
+        self.logger = logger
+        self.next_row = 0
+        self.n_records = 0
+        self.out_size = 0
+        self.done = False
+        self._f = None
+
+    def open(self) -> Tuple[int, int, int]:
+        """
+        Start a new journal, or resume from an existing one.
+
+        Returns
+        -------
+        state: Tuple[int, int, int]
+            Next input row to process, number of records already written
+            and size of the output file at the last checkpoint.
+        """
+        if os_path.exists(self.filename):
+            self._load()
+            self._f = open(self.filename, "a")
+        else:
+            self._f = open(self.filename, "w")
+            self._write(self.fingerprints)
+        return self.next_row, self.n_records, self.out_size
+
+    def _load(self) -> None:
+        with open(self.filename, "rb") as f:
+            lines = f.readlines()
+        try:
+            header = loads(lines[0])
+        except (IndexError, ValueError):
+            # Interrupted before the header was written
+            raise JournalError(
+                f"Cannot resume from {self.filename}: no valid header, remove it to start over"
+            )
+        if header != self.fingerprints:
+            changed = sorted(
+                key
+                for key in set(header) | set(self.fingerprints)
+                if header.get(key) != self.fingerprints.get(key)
+            )
+            raise JournalMismatchError(
+                f"Cannot resume from {self.filename}, changed since the previous run: {', '.join(changed)}"
+            )
+        size = len(lines[0])
+        for line in lines[1:]:
+            try:
+                entry = loads(line)
+            except ValueError:
+                # Partial line written before an interruption
+                break
+            size += len(line)
+            self.next_row = entry["rows"][1]
+            self.n_records = entry["n_records"]
+            self.out_size = entry["out_size"]
+            self.done = entry.get("done", False)
+        # Drop partial lines, if any
+        truncate(self.filename, size)
+        self.logger.debug(
+            f"Resuming from row {self.next_row} ({self.n_records} records, {self.out_size} bytes)"
+        )
+
+    def _write(self, entry: Dict) -> None:
+        self._f.write(dumps(entry) + "\n")
+        self._f.flush()
+        fsync(self._f.fileno())
+
+    def checkpoint(
+        self, next_row: int, n_records: int, out_size: int, done: bool = False
+    ) -> None:
+        """
+        Record rows [self.next_row, next_row) as completed.
+        The output file must have been synced up to 'out_size' beforehand.
+        """
+        entry = {
+            "rows": [self.next_row, next_row],
+            "n_records": n_records,
+            "out_size": out_size,
+        }
+        if done:
+            entry["done"] = True
+        self._write(entry)
+        self.next_row, self.n_records, self.out_size = next_row, n_records, out_size
+        self.done = done
+
+    def close(self) -> None:
+        self._f.close()
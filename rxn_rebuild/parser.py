@@ -0,0 +1,109 @@
+from logging import (
+    Logger,
+    getLogger,
+)
+from typing import Dict, Iterable, List
+from re import compile as re_compile
+
+# Separators (side, compound) per format
+SEPARATORS = {
+    "smiles": (">>", "."),
+    "cid": ("=", "+"),
+}
+# rp2paths stoichiometry style, e.g. 1.CMPD_0000000003:1.MNXM4
+_RP2PATHS_CMPD = re_compile(r"(\d+)\.([^\s:+]+)")
+_RP2PATHS_SIDE = re_compile(r"\d+\.[^\s:+]+(?::\d+\.[^\s:+]+)*")
+
+
+def _parse_side(side: str, sep_cmpd: str, tokens: Dict[str, str]) -> Dict[str, float]:
+    cmpds = {}
+    for cmpd in side.split(sep_cmpd):
+        # Separate stoichio coeff, if any, from compound
+        _list = cmpd.split()
+        if len(_list) > 1:
+            _coeff = float(_list[0])
+            _cmpd = _list[1]
+        else:
+            _coeff = 1.0
+            _cmpd = _list[0]
+        _cmpd = tokens.setdefault(_cmpd, _cmpd)
+        cmpds[_cmpd] = cmpds.get(_cmpd, 0) + _coeff
+    return cmpds
+
+
+def _parse_rp2paths_side(side: str, tokens: Dict[str, str]) -> Dict[str, float]:
+    cmpds = {}
+    for cmpd in side.split(":"):
+        m = _RP2PATHS_CMPD.fullmatch(cmpd.strip())
+        if m is None:
+            raise ValueError(f"Invalid rp2paths compound '{cmpd}'")
+        _cmpd = tokens.setdefault(m.group(2), m.group(2))
+        cmpds[_cmpd] = cmpds.get(_cmpd, 0) + float(m.group(1))
+    return cmpds
+
+
+def parse_transfos(
+    transfos: Iterable[str],
+    logger: Logger = getLogger(__name__),
+) -> List[Dict]:
+    """
+    Parse a whole column of transformations at once.
+
+    Transformations can be given in SMILES (xxx.xxx>>xxx.xxx), with compound
+    IDs (CMPD_ID_1 + CMPD_ID_2 = CMPD_ID_3) or in rp2paths style, compound IDs
+    being prefixed with their stoichiometric coefficients and separated by
+    colons (1.CMPD_ID_1:1.CMPD_ID_2=1.CMPD_ID_3). Repeated compound tokens
+    share one string object and identical sides are parsed only once.
+
+    Parameters
+    ----------
+    transfos: Iterable[str]
+        Transformations.
+    logger : Logger
+        The logger object.
+
+    Returns
+    -------
+    trans_inputs: List[Dict]
+        For each transformation, a dictionary with 'left', 'right', 'format',
+        'sep_side' and 'sep_cmpd' keys as for Reaction.parse(), or None if the
+        transformation could not be parsed.
+    """
+    tokens = {}
+    sides = {}
+    trans_inputs = []
+    n_errors = 0
+
+    for transfo in transfos:
+        if ">>" in transfo:
+            fmt = "smiles"
+        elif "=" in transfo:
+            fmt = "cid"
+        else:
+            n_errors += 1
+            trans_inputs.append(None)
+            continue
+        sep_side, sep_cmpd = SEPARATORS[fmt]
+        try:
+            left, right = transfo.split(sep_side)
+            trans_input = {"format": fmt, "sep_side": sep_side, "sep_cmpd": sep_cmpd}
+            for side_name, side in (("left", left), ("right", right)):
+                key = (fmt, side)
+                if key not in sides:
+                    if fmt == "cid" and _RP2PATHS_SIDE.fullmatch(side.strip()):
+                        sides[key] = _parse_rp2paths_side(side, tokens)
+                    else:
+                        sides[key] = _parse_side(side, sep_cmpd, tokens)
+                trans_input[side_name] = dict(sides[key])
+        except (ValueError, IndexError):
+            n_errors += 1
+            trans_inputs.append(None)
+            continue
+        trans_inputs.append(trans_input)
+
+    logger.debug(
+        f"{len(trans_inputs)} transformations parsed ({n_errors} errors), "
+        f"{len(tokens)} distinct compounds, {len(sides)} distinct sides"
+    )
+
+    return trans_inputs
@@ -0,0 +1,182 @@
+from logging import (
+    Logger,
+    getLogger,
+)
+from typing import TYPE_CHECKING, Dict, FrozenSet, List, Sequence, Set, Tuple
+from rr_cache import rrCache
+from .rxn_rebuild import (
+    check_rule_ids,
+    complete_resolved,
+    resolve_rule,
+    ERR_NO_RESULT,
+    ERR_PARSE,
+    TransfoParseError,
+    parse_transfo,
+)
+
+if TYPE_CHECKING:
+    from .store import ResultStore
+
+
+def plan_rows(rows: List[Tuple[int, Sequence]]) -> Dict[Tuple[str, str], List[int]]:
+    """
+    Group rows by (reaction rule ID, template reaction ID).
+
+    Parameters
+    ----------
+    rows: List[Tuple[int, Sequence]]
+        (index, (rxn_rule_id, transfo, tmpl_rxn_id)) tuples.
+
+    Returns
+    -------
+    groups: Dict[Tuple[str, str], List[int]]
+        Positions in 'rows' of each group, groups coming in order of
+        first appearance.
+    """
+    groups = {}
+    for pos, (_, row) in enumerate(rows):
+        groups.setdefault((row[0], row[2]), []).append(pos)
+    return groups
+
+
+def update_group_stats(stats: Dict, groups: Dict[Tuple[str, str], List[int]]) -> Dict:
+    """
+    Accumulate statistics over groups of rows, groups being planned per chunk
+    of rows: number of 'rows', of 'groups', size of the 'largest' group and
+    number of 'singletons', summed over chunks, and number of 'distinct'
+    (rule, template) pairs over all chunks.
+    """
+    sizes = [len(positions) for positions in groups.values()]
+    stats["rows"] = stats.get("rows", 0) + sum(sizes)
+    stats["groups"] = stats.get("groups", 0) + len(sizes)
+    stats["largest"] = max([stats.get("largest", 0)] + sizes)
+    stats["singletons"] = stats.get("singletons", 0) + sizes.count(1)
+    # Pairs seen in previous chunks, not reported
+    pairs = stats.setdefault("_pairs", set())
+    pairs.update(groups)
+    stats["distinct"] = len(pairs)
+    return stats
+
+
+def log_group_stats(stats: Dict, logger: Logger = getLogger(__name__)) -> None:
+    if not stats.get("groups"):
+        return
+    logger.info(
+        f"   |- per chunk: {stats['rows']} rows in {stats['groups']} (rule, template) groups, "
+        f"{stats['rows'] / stats['groups']:.2f} rows per group on average, "
+        f"largest: {stats['largest']}, singletons: {stats['singletons']}"
+    )
+    logger.info(
+        f"   |- over the run: {stats['distinct']} distinct (rule, template) pairs, "
+        f"{stats['rows'] / stats['distinct']:.2f} rows per pair on average"
+    )
+
+
+def rebuild_planned(
+    rows: List[Tuple[int, Sequence]],
+    cache: "rrCache",
+    rule_index: Dict[str, FrozenSet[str]],
+    cmpds_to_ignore: List[str] = [],
+    cspace_type: str = "rr2026",
+    store: "ResultStore" = None,
+    trans_inputs: Dict[int, Dict] = {},
+    parse_failed: Set[int] = frozenset(),
+    group_stats: Dict = None,
+    logger: Logger = getLogger(__name__),
+) -> List[Dict]:
+    """
+    Complete rows grouped by reaction rule: the template reactions of a rule
+    and the compounds to add are resolved once per group, then applied to
+    every transformation of the group.
+
+    Parameters
+    ----------
+    rows: List[Tuple[int, Sequence]]
+        (index, (rxn_rule_id, transfo, tmpl_rxn_id)) tuples.
+    cache: rrCache
+        Loaded cache.
+    rule_index: Dict[str, FrozenSet[str]]
+        Known reaction rule and template reaction IDs (see build_rule_index).
+    cmpds_to_ignore: List[str]
+        List of compounds to ignore.
+    cspace_type: str
+        Type of chemical space ('legacy' or not).
+    store: ResultStore
+        Persistent result store to look up before completing, and to fill.
+    trans_inputs: Dict[int, Dict]
+        Transformations already parsed, by row index.
+    parse_failed: Set[int]
+        Indices of the rows whose transformation could not be parsed.
+    group_stats: Dict
+        If provided, updated with statistics over groups (see update_group_stats).
+    logger : Logger
+        The logger object.
+
+    Returns
+    -------
+    records: List[Dict]
+        One record per row, in input order, as for rebuild_row().
+    """
+    groups = plan_rows(rows)
+    if group_stats is not None:
+        update_group_stats(group_stats, groups)
+
+    records = [None] * len(rows)
+    for (rxn_rule_id, tmpl_rxn_id), positions in groups.items():
+        resolved = None
+        error = check_rule_ids(rxn_rule_id, tmpl_rxn_id, rule_index)
+        if error is None:
+            try:
+                resolved = resolve_rule(
+                    rxn_rule_id=rxn_rule_id,
+                    tmpl_rxn_id=tmpl_rxn_id,
+                    cache=cache,
+                    cmpds_to_ignore=cmpds_to_ignore,
+                    legacy=cspace_type == "legacy",
+                    logger=logger,
+                )
+            except KeyError as e:
+                logger.error(
+                    f"   |- KeyError: {str(e)} ({len(positions)} rows of rule {rxn_rule_id})"
+                )
+                error = ERR_NO_RESULT
+
+        for pos in positions:
+            i, (_, transfo, _) = rows[pos]
+            row_error = error
+            results = {}
+            if resolved is not None and i in parse_failed:
+                row_error = ERR_PARSE
+            elif resolved is not None:
+                results = None
+                if store is not None:
+                    store_key = store.key(
+                        rxn_rule_id, transfo, tmpl_rxn_id, cmpds_to_ignore, cspace_type
+                    )
+                    results = store.get(store_key)
+                if results is None:
+                    trans_input = trans_inputs.get(i)
+                    try:
+                        if trans_input is None:
+                            trans_input = parse_transfo(transfo, logger)
+                    except TransfoParseError as e:
+                        logger.debug(f"   |- row {i}: {e}")
+                        row_error = ERR_PARSE
+                    else:
+                        results = complete_resolved(
+                            trans_input, resolved, cmpds_to_ignore, logger=logger
+                        )
+                        if store is not None:
+                            store.put(store_key, results, rxn_rule_id)
+            if row_error is None and not results:
+                row_error = ERR_NO_RESULT
+            records[pos] = {
+                "row": i,
+                "rxn_rule_id": rxn_rule_id,
+                "transfo": transfo,
+                "tmpl_rxn_id": tmpl_rxn_id,
+                "error": row_error,
+                "results": results or {},
+            }
+
+    return records
@@ -0,0 +1,168 @@
+from logging import (
+    Logger,
+    getLogger,
+)
+from typing import Callable, Dict, List, Tuple
+from collections import Counter
+from os import path as os_path
+from threading import Event, Thread, get_ident
+from time import perf_counter
+import sys
+
+# Profiling modes
+MODES = ("deterministic", "sampling")
+
+
+def _frame_name(code) -> str:
+    name = (
+        f"{code.co_name} ({os_path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+    # ';' separates frames in collapsed stacks
+    return name.replace(";", ",")
+
+
+def _builtin_name(func) -> str:
+    module = getattr(func, "__module__", None) or "builtins"
+    return f"{module}.{getattr(func, '__qualname__', repr(func))}".replace(";", ",")
+
+
+class StackTracer:
+    """
+    Deterministic profiler: every call and return (including calls to C
+    functions) of the current thread is traced, and the time spent in each
+    function is accumulated per call stack, in microseconds.
+    """
+
+    unit = "us"
+
+    def __init__(self):
+        self.stacks = Counter()
+
+    def _profile(self, frame, event, arg) -> None:
+        now = perf_counter()
+        stack = self._stack
+        self.stacks[stack[-1]] += now - self._last
+        if event == "call":
+            stack.append(stack[-1] + (_frame_name(frame.f_code),))
+        elif event == "c_call":
+            stack.append(stack[-1] + (_builtin_name(arg),))
+        elif len(stack) > 1:
+            # 'return', 'c_return', 'c_exception'
+            # (frames entered before tracing started stay on the root)
+            stack.pop()
+        self._last = perf_counter()
+
+    def __enter__(self) -> "StackTracer":
+        self._stack = [()]
+        self._last = perf_counter()
+        sys.setprofile(self._profile)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        sys.setprofile(None)
+        del self.stacks[()]
+        for stack in self.stacks:
+            self.stacks[stack] = round(self.stacks[stack] * 1e6)
+
+
+class StackSampler:
+    """
+    Sampling profiler: the call stack of the current thread is sampled from
+    a background thread every 'interval' seconds, with little overhead on
+    the profiled code.
+    """
+
+    unit = "samples"
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.stacks = Counter()
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._ident)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def __enter__(self) -> "StackSampler":
+        self._ident = get_ident()
+        self._stop = Event()
+        self._thread = Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def profile_call(
+    func: Callable,
+    mode: str = "sampling",
+    interval: float = 0.001,
+    logger: Logger = getLogger(__name__),
+) -> Tuple[object, Dict]:
+    """
+    Call a function under a profiler.
+
+    Parameters
+    ----------
+    func: Callable
+        Function to call, with no argument.
+    mode: str
+        'deterministic' (every call traced) or 'sampling'.
+    interval: float
+        Sampling interval, in seconds.
+    logger : Logger
+        The logger object.
+
+    Returns
+    -------
+    result: object
+        What the function returned.
+    profile: Dict
+        'stacks' (weight per call stack), 'unit' of the weights and 'wall'
+        time, in seconds.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Invalid profiling mode '{mode}', expected one of {MODES}")
+    profiler = StackTracer() if mode == "deterministic" else StackSampler(interval)
+    start = perf_counter()
+    with profiler:
+        result = func()
+    wall = perf_counter() - start
+    logger.debug(f"   |- {len(profiler.stacks)} distinct stacks in {wall:.3f}s")
+    return result, {"stacks": profiler.stacks, "unit": profiler.unit, "wall": wall}
+
+
+def write_collapsed(stacks: Dict[Tuple[str], int], filename: str) -> None:
+    """
+    Write call stacks in collapsed format ('frame;frame;frame weight' lines),
+    as expected by flamegraph.pl, speedscope or inferno.
+    """
+    with open(filename, "w") as f:
+        for stack, weight in sorted(stacks.items()):
+            if weight > 0:
+                f.write(f"{';'.join(stack)} {weight}\n")
+
+
+def top_functions(stacks: Dict[Tuple[str], int], n: int = 20) -> List[Dict]:
+    """
+    Hottest functions, by 'self' weight (spent in the function itself), with
+    their 'total' weight (spent in the function and the ones it calls).
+    """
+    self_weights = Counter()
+    total_weights = Counter()
+    for stack, weight in stacks.items():
+        self_weights[stack[-1]] += weight
+        # Recursive functions counted once per stack
+        for func in set(stack):
+            total_weights[func] += weight
+    return [
+        {"function": func, "self": weight, "total": total_weights[func]}
+        for func, weight in self_weights.most_common(n)
+    ]
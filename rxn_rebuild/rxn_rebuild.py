@@ -2,13 +2,94 @@ from logging import (
     Logger,
     getLogger,
 )
-from typing import List, Dict, Tuple
+from typing import TYPE_CHECKING, List, Dict, Tuple, FrozenSet
 from collections import Counter
 from json import dumps
 from copy import deepcopy
+from time import monotonic
 from rr_cache import rrCache
 from chemlite import Reaction
 from .Args import DEFAULTS
+from .ignore import IgnoreSet
+from .shm import SharedCache, attach_cache
+
+if TYPE_CHECKING:
+    from .store import ResultStore
+
+# Per-row error codes
+ERR_UNKNOWN_RULE = "UNKNOWN_RULE"
+ERR_UNKNOWN_TMPL = "UNKNOWN_TEMPLATE"
+ERR_NO_RESULT = "NO_RESULT"
+ERR_PARSE = "PARSE_ERROR"
+
+
+class TransfoParseError(ValueError):
+    """
+    Raised when a transformation cannot be parsed.
+    """
+
+
+def parse_transfo(transfo: str, logger: Logger = getLogger(__name__)) -> Dict:
+    """
+    Parse a transformation with Reaction.parse(), raising TransfoParseError
+    whatever the way the transformation is malformed.
+    """
+    try:
+        return Reaction.parse(transfo, logger)
+    except Exception as e:
+        raise TransfoParseError(f"Cannot parse transformation '{transfo}': {e}") from e
+
+
+def build_rule_index(cache: "rrCache") -> Dict[str, FrozenSet[str]]:
+    """
+    Build membership sets over the reaction rule IDs and the (reaction rule,
+    template reaction) ID pairs known in the cache, so that unknown IDs can
+    be rejected without any parsing nor lookup.
+
+    Parameters
+    ----------
+    cache: rrCache
+        Loaded cache.
+
+    Returns
+    -------
+    rule_index: Dict
+        'rules' set of known reaction rule IDs and 'rule_templates' set of
+        the (reaction rule ID, template reaction ID) pairs of the cache.
+    """
+    rr_reactions = cache.get("rr_reactions")
+    if isinstance(cache, SharedCache):
+        # Looked up in place in shared memory, no rule decoded
+        return {"rules": rr_reactions, "rule_templates": cache.rule_templates()}
+    return {
+        "rules": frozenset(rr_reactions),
+        "rule_templates": frozenset(
+            (rxn_rule_id, tmpl_rxn_id)
+            for rxn_rule_id, tmpl_rxns in rr_reactions.items()
+            for tmpl_rxn_id in tmpl_rxns
+        ),
+    }
+
+
+def check_rule_ids(
+    rxn_rule_id: str, tmpl_rxn_id: str, rule_index: Dict[str, FrozenSet[str]]
+) -> str:
+    """
+    Check reaction rule and template reaction IDs against the rule index.
+
+    Returns
+    -------
+    error: str
+        Error code if one of the IDs is unknown, or if the template reaction
+        is not one of the reaction rule, None otherwise.
+    """
+    if rxn_rule_id not in rule_index["rules"]:
+        return ERR_UNKNOWN_RULE
+    if tmpl_rxn_id is not None and (
+        (rxn_rule_id, tmpl_rxn_id) not in rule_index["rule_templates"]
+    ):
+        return ERR_UNKNOWN_TMPL
+    return None
 
 
 def rebuild_rxn(
@@ -19,8 +100,17 @@ def rebuild_rxn(
     cmpds_to_ignore: List[str] = [],
     cspace: str = DEFAULTS["cspace"],
     cspace_type: str = "rr2026",
+    rule_index: Dict[str, FrozenSet[str]] = None,
+    shm_name: str = None,
+    store: "ResultStore" = None,
+    trans_input: Dict = None,
+    deadline: float = None,
+    max_templates: int = None,
+    status: Dict = None,
     logger: Logger = getLogger(__name__),
 ) -> str:
+    # Time budget starts now
+    t_end = monotonic() + deadline if deadline is not None else None
 
     logger.debug(f"rxn_rule_id: {rxn_rule_id}")
     logger.debug(f"transfo: {transfo}")
@@ -28,11 +118,38 @@ def rebuild_rxn(
     logger.debug(f"cmpds_to_ignore: {cmpds_to_ignore}")
     logger.debug(f"cspace: {cspace}")
     logger.debug(f"cspace_type: {cspace_type}")
+    logger.debug(f"shm_name: {shm_name}")
+    logger.debug(f"deadline: {deadline}")
+    logger.debug(f"max_templates: {max_templates}")
+
+    if status is not None:
+        status.update(partial=False, skipped=0)
+
+    ## FAST REJECTION OF UNKNOWN IDS
+    if rule_index is not None:
+        error = check_rule_ids(rxn_rule_id, tmpl_rxn_id, rule_index)
+        if error is not None:
+            logger.debug(f"   |- {error}: {rxn_rule_id} ({tmpl_rxn_id})")
+            return {}
+
+    ## STORED RESULTS
+    if store is not None:
+        store_key = store.key(
+            rxn_rule_id, transfo, tmpl_rxn_id, cmpds_to_ignore, cspace_type
+        )
+        completed_transfos = store.get(store_key)
+        if completed_transfos is not None:
+            return completed_transfos
 
     ## INPUT TRANSFORMATION
-    trans_input = Reaction.parse(transfo, logger)
+    # Not parsed yet (see parser.parse_transfos for bulk parsing)
+    if trans_input is None:
+        trans_input = parse_transfo(transfo, logger)
 
     ## LOAD CACHE
+    if cache is None and shm_name is not None:
+        # Cache published in shared memory (see shm.publish_cache)
+        cache = attach_cache(shm_name, logger=logger)
     if cache is None:
         # cache = rrCache(
         #     attrs=['rr_reactions', 'template_reactions', 'cid_strc']
@@ -42,30 +159,29 @@ def rebuild_rxn(
 
     ## COMPLETE TRANSFORMATION
     try:
-        legacy = cspace_type == "legacy"
-        completed_transfos = {}
-        # One completed transformation per template reaction
-        if tmpl_rxn_id is None:
-            for tpl_rxn_id, rxn_rule in cache.get("rr_reactions")[rxn_rule_id].items():
-                completed_transfos[tpl_rxn_id] = complete_transfo(
-                    trans_input=trans_input,
-                    rxn_rule=rxn_rule,
-                    tmpl_rxn=cache.get("template_reactions")[tpl_rxn_id],
-                    tmpl_rxn_id=tpl_rxn_id,
-                    compounds=cache.get("cid_strc"),
-                    cmpds_to_ignore=cmpds_to_ignore,
-                    legacy=legacy,
-                    logger=logger,
-                )
+        if t_end is None and max_templates is None:
+            resolved = resolve_rule(
+                rxn_rule_id=rxn_rule_id,
+                tmpl_rxn_id=tmpl_rxn_id,
+                cache=cache,
+                cmpds_to_ignore=cmpds_to_ignore,
+                legacy=cspace_type == "legacy",
+                logger=logger,
+            )
+            completed_transfos = complete_resolved(
+                trans_input, resolved, cmpds_to_ignore, logger=logger
+            )
+            skipped = 0
         else:
-            completed_transfos[tmpl_rxn_id] = complete_transfo(
+            completed_transfos, skipped = complete_within_budget(
                 trans_input=trans_input,
-                rxn_rule=cache.get("rr_reactions")[rxn_rule_id][tmpl_rxn_id],
-                tmpl_rxn=cache.get("template_reactions")[tmpl_rxn_id],
+                rxn_rule_id=rxn_rule_id,
                 tmpl_rxn_id=tmpl_rxn_id,
-                compounds=cache.get("cid_strc"),
+                cache=cache,
                 cmpds_to_ignore=cmpds_to_ignore,
-                legacy=legacy,
+                legacy=cspace_type == "legacy",
+                t_end=t_end,
+                max_templates=max_templates,
                 logger=logger,
             )
     except KeyError as e:
@@ -75,38 +191,216 @@ def rebuild_rxn(
         )
         return {}
 
+    if status is not None:
+        status.update(partial=skipped > 0, skipped=skipped)
+    # Partial results are not stored
+    if store is not None and skipped == 0:
+        store.put(store_key, completed_transfos, rxn_rule_id)
+
     return completed_transfos
 
 
-def complete_transfo(
+def order_templates(rr_reactions: Dict) -> List[str]:
+    """
+    Template reaction IDs of a reaction rule, best scored rules first.
+    """
+    return sorted(
+        rr_reactions,
+        key=lambda tpl_rxn_id: -(rr_reactions[tpl_rxn_id].get("rule_score") or 0),
+    )
+
+
+def complete_within_budget(
     trans_input: Dict,
+    rxn_rule_id: str,
+    tmpl_rxn_id: str,
+    cache: "rrCache",
+    cmpds_to_ignore: List[str] = [],
+    legacy: bool = False,
+    t_end: float = None,
+    max_templates: int = None,
+    logger: Logger = getLogger(__name__),
+) -> Tuple[Dict, int]:
+    """
+    Complete a transformation template reaction by template reaction, best
+    scored rules first, until the time budget or the number of templates
+    is exhausted.
+
+    Parameters
+    ----------
+    t_end: float
+        Time (as given by time.monotonic()) after which no more template
+        reaction is processed.
+    max_templates: int
+        Maximum number of template reactions to process.
+
+    Returns
+    -------
+    completed_transfos: Dict
+        Completed transformations, per template reaction processed.
+    skipped: int
+        Number of template reactions not processed.
+    """
+    # Fetched once, not per template reaction (decoded on access when shared)
+    rr_reactions = cache.get("rr_reactions")[rxn_rule_id]
+    template_reactions = cache.get("template_reactions")
+    compounds = cache.get("cid_strc")
+    tmpl_rxn_ids = (
+        order_templates(rr_reactions) if tmpl_rxn_id is None else [tmpl_rxn_id]
+    )
+    completed_transfos = {}
+    for tpl_rxn_id in tmpl_rxn_ids:
+        if max_templates is not None and len(completed_transfos) >= max_templates:
+            break
+        if t_end is not None and monotonic() >= t_end:
+            break
+        resolved = {
+            tpl_rxn_id: resolve_template(
+                rr_reactions[tpl_rxn_id],
+                template_reactions[tpl_rxn_id],
+                compounds,
+                cmpds_to_ignore=cmpds_to_ignore,
+                legacy=legacy,
+                logger=logger,
+            )
+        }
+        completed_transfos.update(
+            complete_resolved(trans_input, resolved, cmpds_to_ignore, logger)
+        )
+    skipped = len(tmpl_rxn_ids) - len(completed_transfos)
+    if skipped > 0:
+        logger.debug(f"   |- {skipped} template reactions skipped (budget exhausted)")
+    return completed_transfos, skipped
+
+
+def resolve_rule(
+    rxn_rule_id: str,
+    tmpl_rxn_id: str,
+    cache: "rrCache",
+    cmpds_to_ignore: List[str] = [],
+    legacy: bool = False,
+    logger: Logger = getLogger(__name__),
+) -> Dict:
+    """
+    Resolve the template reactions of a reaction rule and the compounds to
+    add for each of them, once for all the transformations to complete with
+    this rule.
+
+    Parameters
+    ----------
+    rxn_rule_id: str
+        Reaction rule ID.
+    tmpl_rxn_id: str
+        Template reaction ID, None for all template reactions of the rule.
+    cache: rrCache
+        Loaded cache.
+    cmpds_to_ignore: List[str]
+        List of compounds to ignore.
+    legacy: bool
+        Legacy rules mode.
+    logger : Logger
+        The logger object.
+
+    Returns
+    -------
+    resolved: Dict
+        Per template reaction ID, the 'rxn_rule', the 'tmpl_rxn' and the
+        'missing_compounds'.
+
+    Raises
+    ------
+    KeyError
+        If the reaction rule or a template reaction is not known in the cache.
+    """
+    rr_reactions = cache.get("rr_reactions")[rxn_rule_id]
+    template_reactions = cache.get("template_reactions")
+    compounds = cache.get("cid_strc")
+    # One completed transformation per template reaction
+    tmpl_rxn_ids = rr_reactions.keys() if tmpl_rxn_id is None else [tmpl_rxn_id]
+    return {
+        tpl_rxn_id: resolve_template(
+            rr_reactions[tpl_rxn_id],
+            template_reactions[tpl_rxn_id],
+            compounds,
+            cmpds_to_ignore=cmpds_to_ignore,
+            legacy=legacy,
+            logger=logger,
+        )
+        for tpl_rxn_id in tmpl_rxn_ids
+    }
+
+
+def resolve_template(
     rxn_rule: Dict,
     tmpl_rxn: Dict,
-    tmpl_rxn_id: str,
     compounds: Dict,
     cmpds_to_ignore: List[str] = [],
     legacy: bool = False,
     logger: Logger = getLogger(__name__),
 ) -> Dict:
+    """
+    Resolve the compounds to add for one template reaction of a reaction
+    rule, the rule and the template reaction being already fetched, along
+    with the compounds 'ignored' (counted per completion, see
+    complete_resolved).
+    """
+    ignored = Counter()
+    return {
+        "rxn_rule": rxn_rule,
+        "tmpl_rxn": tmpl_rxn,
+        "missing_compounds": find_missing_compounds(
+            rxn_rule,
+            tmpl_rxn,
+            compounds,
+            cmpds_to_ignore=cmpds_to_ignore,
+            legacy=legacy,
+            ignored=ignored,
+            logger=logger,
+        ),
+        "ignored": ignored,
+    }
 
-    logger.debug(f"TRANS_INPUT: {dumps(trans_input, indent=4)}")
-    logger.debug(f"REACTION RULE: {dumps(rxn_rule, indent=4)}")
-    logger.debug(f"TEMPLATE REACTION ({tmpl_rxn_id}): {dumps(tmpl_rxn, indent=4)}")
-    # logger.debug(f'COMPOUNDS: {dumps(compounds, indent=4)}')
-    logger.debug(f"CMPDS TO IGNORE: {cmpds_to_ignore}")
 
-    ## CHECK 1/2
-    # Check if the number of structures in the right part of SMILES of transformation to complete
-    # is equal to the number of products of the template reaction used to build the reaction rule.
-    # Just in right part since rules are always mono-substrate
-    check_compounds_number(
-        "INPUT TRANSFORMATION [right]",
-        trans_input["right"],
-        "REACTION RULE [right]",
-        rxn_rule["right"],
-        logger=logger,
-    )
+def complete_resolved(
+    trans_input: Dict,
+    resolved: Dict,
+    cmpds_to_ignore: List[str] = [],
+    logger: Logger = getLogger(__name__),
+) -> Dict:
+    """
+    Complete a transformation with a resolved reaction rule (see resolve_rule),
+    one completed transformation per template reaction. The compounds ignored
+    are counted per completed transformation, however many transformations
+    a resolution is shared by (see IgnoreSet).
+    """
+    completed_transfos = {}
+    for tpl_rxn_id, tpl in resolved.items():
+        completed_transfos[tpl_rxn_id] = complete_transfo(
+            trans_input=trans_input,
+            rxn_rule=tpl["rxn_rule"],
+            tmpl_rxn=tpl["tmpl_rxn"],
+            tmpl_rxn_id=tpl_rxn_id,
+            missing_compounds=tpl["missing_compounds"],
+            logger=logger,
+        )
+        if isinstance(cmpds_to_ignore, IgnoreSet):
+            cmpds_to_ignore.counts.update(tpl["ignored"])
+    return completed_transfos
 
+
+def find_missing_compounds(
+    rxn_rule: Dict,
+    tmpl_rxn: Dict,
+    compounds: Dict,
+    cmpds_to_ignore: List[str] = [],
+    legacy: bool = False,
+    ignored: Counter = None,
+    logger: Logger = getLogger(__name__),
+) -> Dict:
+    """
+    Compounds to add to a transformation completed with a reaction rule,
+    'ignored' counting, if provided, the compounds ignored.
+    """
     if legacy:
         logger.debug("Entering in legacy rules mode")
 
@@ -123,6 +417,7 @@ def complete_transfo(
             rxn_rule,
             compounds,
             cmpds_to_ignore=cmpds_to_ignore,
+            ignored=ignored,
             logger=logger,
         )
     else:
@@ -132,6 +427,57 @@ def complete_transfo(
             "right": dict((Counter(rxn_rule["right_excluded"]))),
         }
     logger.debug("MISSING COMPOUNDS: " + str(dumps(missing_compounds, indent=4)))
+    return missing_compounds
+
+
+def complete_transfo(
+    trans_input: Dict,
+    rxn_rule: Dict,
+    tmpl_rxn: Dict,
+    tmpl_rxn_id: str,
+    compounds: Dict = None,
+    cmpds_to_ignore: List[str] = [],
+    legacy: bool = False,
+    missing_compounds: Dict = None,
+    logger: Logger = getLogger(__name__),
+) -> Dict:
+
+    logger.debug(f"TRANS_INPUT: {dumps(trans_input, indent=4)}")
+    logger.debug(f"REACTION RULE: {dumps(rxn_rule, indent=4)}")
+    logger.debug(f"TEMPLATE REACTION ({tmpl_rxn_id}): {dumps(tmpl_rxn, indent=4)}")
+    # logger.debug(f'COMPOUNDS: {dumps(compounds, indent=4)}')
+    logger.debug(f"CMPDS TO IGNORE: {cmpds_to_ignore}")
+
+    ## CHECK 1/2
+    # Check if the number of structures in the right part of SMILES of transformation to complete
+    # is equal to the number of products of the template reaction used to build the reaction rule.
+    # Just in right part since rules are always mono-substrate
+    check_compounds_number(
+        "INPUT TRANSFORMATION [right]",
+        trans_input["right"],
+        "REACTION RULE [right]",
+        rxn_rule["right"],
+        logger=logger,
+    )
+
+    if missing_compounds is None:
+        ignored = Counter()
+        missing_compounds = find_missing_compounds(
+            rxn_rule,
+            tmpl_rxn,
+            compounds,
+            cmpds_to_ignore=cmpds_to_ignore,
+            legacy=legacy,
+            ignored=ignored,
+            logger=logger,
+        )
+        if isinstance(cmpds_to_ignore, IgnoreSet):
+            cmpds_to_ignore.counts.update(ignored)
+    else:
+        # Resolved once for several transformations, not to be shared
+        missing_compounds = {
+            side: dict(cmpds) for side, cmpds in missing_compounds.items()
+        }
 
     ## BUILD FINAL TRANSFORMATION
     compl_transfo = build_final_transfo(
@@ -322,6 +668,7 @@ def detect_missing_compounds(
     rxn_rule: Dict,
     cid_strc: Dict,
     cmpds_to_ignore: List[str] = [],
+    ignored: Counter = None,
     logger: Logger = getLogger(__file__),
 ) -> Tuple[Dict, List]:
     """
@@ -337,6 +684,8 @@ def detect_missing_compounds(
         Compound structures.
     cmpds_to_ignore: List[str]
         List of compounds to ignore.
+    ignored: Counter
+        If provided, counts the compounds ignored.
     logger : Logger
         The logger object.
 
@@ -365,9 +714,13 @@ def detect_missing_compounds(
         # Fill the dictionary with all informations about the compounds to add
         for cmp_id, cmp_sto in diff_cmpds.items():
             if cmp_id in cmpds_to_ignore:
-                logger.warning(
-                    f"      + Ignoring compound {cmp_id} ({cmp_sto}) on {side} side of the transformation"
-                )
+                if ignored is not None:
+                    ignored[cmp_id] += 1
+                if not isinstance(cmpds_to_ignore, IgnoreSet):
+                    # Otherwise reported once for the whole run (see log_ignored)
+                    logger.warning(
+                        f"      + Ignoring compound {cmp_id} ({cmp_sto}) on {side} side of the transformation"
+                    )
                 continue
             added_compounds[side][cmp_id] = cmp_sto
             # # Flag compounds with no structure
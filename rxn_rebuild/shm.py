@@ -0,0 +1,267 @@
+from logging import (
+    Logger,
+    getLogger,
+)
+from typing import TYPE_CHECKING, Dict, Iterator, Tuple
+from collections.abc import Mapping
+from json import dumps, loads
+from os import name as os_name
+from struct import Struct
+from rr_cache import rrCache
+
+if TYPE_CHECKING:
+    from multiprocessing.shared_memory import SharedMemory
+
+CACHE_ATTRS = ("rr_reactions", "template_reactions", "cid_strc")
+# Published along with rr_reactions: keys are "<rule ID>\t<template ID>",
+# for (rule, template) pairs to be checked without decoding any rule
+_RULE_TEMPLATES = "rule_templates"
+
+# Layout of the shared memory block:
+#   header | per attribute: entries | keys | values | directory (JSON)
+# The header gives the offset and length of the directory, which gives,
+# per cache attribute, the offset and number of its entries. Entries are
+# sorted by key and give the offset and length of the key (UTF-8) and of
+# the value (JSON), so that keys are looked up in place by binary search.
+_MAGIC = b"RXNRBLD2"
+_HEADER = Struct("<8sQQ")
+_ENTRY = Struct("<QIQI")
+
+# Shared caches already attached by this process, by name
+_ATTACHED = {}
+
+
+def check_platform() -> None:
+    """
+    Shared caches need POSIX shared memory: elsewhere (Windows), a block
+    is destroyed as soon as the process which published it exits.
+    """
+    if os_name != "posix":
+        raise OSError("Publishing the cache into shared memory needs a POSIX system")
+
+
+def _untrack(shm: "SharedMemory") -> None:
+    # Prevent the resource tracker from unlinking the block when this process
+    # exits, the block outliving the processes that publish or attach it.
+    try:
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+def publish_cache(
+    cache: "rrCache",
+    name: str,
+    attrs: Tuple[str] = CACHE_ATTRS,
+    logger: Logger = getLogger(__name__),
+) -> str:
+    """
+    Publish a loaded cache into a named POSIX shared memory block,
+    which can then be attached by independent processes (see SharedCache).
+
+    Parameters
+    ----------
+    cache: rrCache
+        Loaded cache.
+    name: str
+        Name of the shared memory block.
+    attrs: Tuple[str]
+        Cache attributes to publish.
+    logger : Logger
+        The logger object.
+
+    Returns
+    -------
+    name: str
+        Name of the shared memory block.
+    """
+    from multiprocessing.shared_memory import SharedMemory
+
+    check_platform()
+
+    tables = [(attr, cache.get(attr)) for attr in attrs]
+    if "rr_reactions" in attrs:
+        tables.append(
+            (
+                _RULE_TEMPLATES,
+                {
+                    f"{rxn_rule_id}\t{tmpl_rxn_id}": None
+                    for rxn_rule_id, tmpl_rxns in cache.get("rr_reactions").items()
+                    for tmpl_rxn_id in tmpl_rxns
+                },
+            )
+        )
+
+    chunks = []
+    directory = {}
+    offset = _HEADER.size
+    for attr, data in tables:
+        keys = sorted(key.encode("utf-8") for key in data)
+        values = [
+            dumps(data[key.decode("utf-8")], separators=(",", ":")).encode("utf-8")
+            for key in keys
+        ]
+        directory[attr] = (offset, len(keys))
+        key_offset = offset + _ENTRY.size * len(keys)
+        value_offset = key_offset + sum(len(key) for key in keys)
+        entries = bytearray()
+        for key, value in zip(keys, values):
+            entries += _ENTRY.pack(key_offset, len(key), value_offset, len(value))
+            key_offset += len(key)
+            value_offset += len(value)
+        chunks.append(bytes(entries))
+        chunks.extend(keys)
+        chunks.extend(values)
+        offset = value_offset
+    directory_chunk = dumps(directory, separators=(",", ":")).encode("utf-8")
+
+    shm = SharedMemory(name=name, create=True, size=offset + len(directory_chunk))
+    _untrack(shm)
+    try:
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, offset, len(directory_chunk))
+        pos = _HEADER.size
+        for chunk in chunks:
+            shm.buf[pos : pos + len(chunk)] = chunk
+            pos += len(chunk)
+        shm.buf[offset : offset + len(directory_chunk)] = directory_chunk
+    except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+    logger.debug(f"Cache published in shared memory '{name}' ({shm.size} bytes)")
+    shm.close()
+
+    return name
+
+
+def unlink_cache(name: str, logger: Logger = getLogger(__name__)) -> None:
+    """
+    Remove a published cache from shared memory.
+    """
+    from multiprocessing.shared_memory import SharedMemory
+
+    attached = _ATTACHED.pop(name, None)
+    if attached is not None:
+        attached.close()
+    shm = SharedMemory(name=name, create=False)
+    shm.close()
+    shm.unlink()
+    logger.debug(f"Shared memory '{name}' unlinked")
+
+
+class SharedMapping(Mapping):
+    """
+    Read-only mapping over one cache attribute stored in shared memory.
+    Keys are looked up and values decoded on access, straight from the
+    shared buffer, nothing being copied into the process.
+    """
+
+    def __init__(self, buf: memoryview, offset: int, n: int):
+        self._buf = buf
+        self._offset = offset
+        self._n = n
+
+    def _entry(self, i: int) -> Tuple[int, int, int, int]:
+        return _ENTRY.unpack_from(self._buf, self._offset + i * _ENTRY.size)
+
+    def _key(self, entry: Tuple[int, int, int, int]) -> bytes:
+        return bytes(self._buf[entry[0] : entry[0] + entry[1]])
+
+    def _find(self, key: object) -> Tuple[int, int, int, int]:
+        if not isinstance(key, str):
+            return None
+        key = key.encode("utf-8")
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._entry(mid)
+            mid_key = self._key(entry)
+            if mid_key == key:
+                return entry
+            if mid_key < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def __getitem__(self, key: str) -> Dict:
+        entry = self._find(key)
+        if entry is None:
+            raise KeyError(key)
+        return loads(bytes(self._buf[entry[2] : entry[2] + entry[3]]))
+
+    def __contains__(self, key: object) -> bool:
+        return self._find(key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._n):
+            yield self._key(self._entry(i)).decode("utf-8")
+
+    def __len__(self) -> int:
+        return self._n
+
+
+class SharedPairs:
+    """
+    Read-only set of (reaction rule ID, template reaction ID) pairs, looked
+    up in place in shared memory.
+    """
+
+    def __init__(self, mapping: SharedMapping):
+        self._mapping = mapping
+
+    def __contains__(self, pair: object) -> bool:
+        if not isinstance(pair, tuple) or len(pair) != 2:
+            return False
+        return f"{pair[0]}\t{pair[1]}" in self._mapping
+
+    def __len__(self) -> int:
+        return len(self._mapping)
+
+
+class SharedCache:
+    """
+    Cache backend attached to a block published by publish_cache(),
+    to be used in place of rrCache.
+    """
+
+    def __init__(self, name: str, logger: Logger = getLogger(__name__)):
+        from multiprocessing.shared_memory import SharedMemory
+
+        self.name = name
+        self._shm = SharedMemory(name=name, create=False)
+        _untrack(self._shm)
+        magic, offset, length = _HEADER.unpack_from(self._shm.buf, 0)
+        if magic != _MAGIC:
+            self._shm.close()
+            raise ValueError(f"Shared memory '{name}' does not hold a published cache")
+        directory = loads(bytes(self._shm.buf[offset : offset + length]))
+        self._attrs = {
+            attr: SharedMapping(self._shm.buf, attr_offset, n)
+            for attr, (attr_offset, n) in directory.items()
+        }
+        logger.debug(f"Attached to shared memory '{name}' ({self._shm.size} bytes)")
+
+    def get(self, attr: str) -> SharedMapping:
+        return self._attrs[attr]
+
+    def rule_templates(self) -> SharedPairs:
+        """
+        (reaction rule ID, template reaction ID) pairs of the cache.
+        """
+        return SharedPairs(self._attrs[_RULE_TEMPLATES])
+
+    def close(self) -> None:
+        self._attrs = {}
+        self._shm.close()
+
+
+def attach_cache(name: str, logger: Logger = getLogger(__name__)) -> SharedCache:
+    """
+    Attach to a published cache, once per process.
+    """
+    if name not in _ATTACHED:
+        _ATTACHED[name] = SharedCache(name, logger=logger)
+    return _ATTACHED[name]
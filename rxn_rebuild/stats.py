@@ -0,0 +1,248 @@
+from logging import (
+    Logger,
+    getLogger,
+)
+from typing import Dict, Tuple
+from sys import getsizeof
+from hashlib import sha256
+from re import fullmatch
+import tracemalloc
+from rr_cache import rrCache
+from .batch import DictCache, shard_attr
+from .fingerprint import update_fingerprint
+from .shm import CACHE_ATTRS
+
+_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+class MemoryBudgetError(MemoryError):
+    """
+    Raised when loading the cache would exceed the memory budget.
+    """
+
+
+def parse_size(size: str) -> int:
+    """
+    Parse a memory size, e.g. '512M', '8G' or a number of bytes.
+    """
+    m = fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", size.upper())
+    if m is None:
+        raise ValueError(f"Invalid memory size '{size}', expected e.g. 512M, 8G")
+    return int(float(m.group(1)) * _UNITS[m.group(2)])
+
+
+def format_size(size: int) -> str:
+    for unit in ["", "K", "M", "G"]:
+        if abs(size) < 1024:
+            return f"{size:.1f}{unit}B" if unit else f"{size}B"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def deep_size(obj: object) -> int:
+    """
+    Estimate the memory size of an object and of all objects it holds
+    (containers and scalars), each object being counted once.
+    """
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        size += getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+    return size
+
+
+def _rss() -> int:
+    # Resident set size, Linux only
+    try:
+        from os import sysconf
+
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, ImportError):
+        return None
+
+
+def cache_stats(cache: "rrCache", attrs: Tuple[str] = CACHE_ATTRS) -> Dict:
+    """
+    Number of entries and estimated deep size of each cache attribute.
+    """
+    stats = {}
+    for attr in attrs:
+        data = cache.get(attr)
+        stats[attr] = {
+            "entries": len(data),
+            "deep_size": deep_size(data) if isinstance(data, dict) else None,
+        }
+    return stats
+
+
+def load_measured_cache(
+    cspace: str,
+    attrs: Tuple[str] = CACHE_ATTRS,
+    max_memory: int = None,
+    estimates: Dict = None,
+    logger: Logger = getLogger(__name__),
+) -> Tuple[DictCache, Dict]:
+    """
+    Load cache attributes one by one, measuring the memory each one takes
+    (traced by tracemalloc, and RSS when available) and enforcing a budget.
+
+    Parameters
+    ----------
+    cspace: str
+        Chemical space to load.
+    attrs: Tuple[str]
+        Cache attributes to load.
+    max_memory: int
+        Memory budget, in bytes, for the whole cache.
+    estimates: Dict
+        Memory taken by each attribute in a previous load (as returned in
+        stats), to fail before loading an attribute that would not fit.
+    logger : Logger
+        The logger object.
+
+    Returns
+    -------
+    cache: DictCache
+        Loaded cache.
+    stats: Dict
+        Per attribute: 'entries', 'deep_size', 'traced' and 'rss' deltas on
+        load, in bytes.
+    """
+    estimates = estimates or {}
+    data = {}
+    stats = {}
+    total = 0
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        for attr in attrs:
+            estimate = estimates.get(attr, {}).get("traced")
+            if max_memory is not None and estimate is not None:
+                if total + estimate > max_memory:
+                    raise MemoryBudgetError(
+                        f"Loading '{attr}' of {cspace} would exceed the memory budget: "
+                        f"{format_size(total)} loaded + {format_size(estimate)} expected > {format_size(max_memory)}"
+                    )
+            rss_before = _rss()
+            traced_before = tracemalloc.get_traced_memory()[0]
+            data[attr] = rrCache(
+                attrs=[attr], cspace=cspace, interactive=False, logger=logger
+            ).get(attr)
+            traced = tracemalloc.get_traced_memory()[0] - traced_before
+            rss_after = _rss()
+            total += traced
+            stats[attr] = {
+                "entries": len(data[attr]),
+                "deep_size": deep_size(data[attr]),
+                "traced": traced,
+                "rss": (
+                    rss_after - rss_before
+                    if rss_before is not None and rss_after is not None
+                    else None
+                ),
+            }
+            logger.debug(f"   |- {attr}: {stats[attr]}")
+            if max_memory is not None and total > max_memory:
+                raise MemoryBudgetError(
+                    f"Loading {cspace} exceeded the memory budget at '{attr}': "
+                    f"{format_size(total)} > {format_size(max_memory)}"
+                )
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    return DictCache(data), stats
+
+
+def load_budgeted_cache(
+    cspace: str,
+    max_memory: int = None,
+    attrs: Tuple[str] = CACHE_ATTRS,
+    estimates: Dict = None,
+    shard: Tuple[int, int] = None,
+    info: Dict = None,
+    logger: Logger = getLogger(__name__),
+) -> DictCache:
+    """
+    Load cache attributes one by one, enforcing a memory budget on the
+    resident set size they take. Unlike load_measured_cache, nothing is
+    traced nor walked, so that the guard adds no memory or time to the load.
+
+    Parameters
+    ----------
+    cspace: str
+        Chemical space to load.
+    max_memory: int
+        Memory budget, in bytes, for the whole cache, None for no budget.
+    attrs: Tuple[str]
+        Cache attributes to load.
+    estimates: Dict
+        Memory taken by each attribute in a previous load (as returned in
+        stats by load_measured_cache), to fail before loading an attribute
+        that would not fit.
+    shard: Tuple[int, int]
+        (i, N) to keep only the reaction rules owned by shard i out of N
+        (see batch.shard_attr), each attribute being restricted as soon as
+        loaded.
+    info: Dict
+        If provided, gets the 'fingerprint' of the whole cache data (see
+        fingerprint.cache_fingerprint), whatever the shard.
+    logger : Logger
+        The logger object.
+
+    Returns
+    -------
+    cache: DictCache
+        Loaded cache.
+    """
+    estimates = estimates or {}
+    if max_memory is not None and _rss() is None:
+        logger.warning("Resident set size not available, memory budget not enforced")
+    fingerprint = sha256()
+    data = {}
+    total = 0
+    for attr in attrs:
+        estimate = estimates.get(attr, {}).get("rss")
+        if (
+            max_memory is not None
+            and estimate is not None
+            and total + estimate > max_memory
+        ):
+            raise MemoryBudgetError(
+                f"Loading '{attr}' of {cspace} would exceed the memory budget: "
+                f"{format_size(total)} loaded + {format_size(estimate)} expected > {format_size(max_memory)}"
+            )
+        rss_before = _rss()
+        data[attr] = rrCache(
+            attrs=[attr], cspace=cspace, interactive=False, logger=logger
+        ).get(attr)
+        if info is not None:
+            update_fingerprint(fingerprint, attr, data[attr])
+        if shard is not None:
+            data[attr] = shard_attr(attr, data[attr], shard, data.get("rr_reactions"))
+        rss_after = _rss()
+        if max_memory is None or rss_before is None or rss_after is None:
+            continue
+        total += max(0, rss_after - rss_before)
+        logger.debug(f"   |- {attr}: {format_size(total)} loaded")
+        if total > max_memory:
+            raise MemoryBudgetError(
+                f"Loading {cspace} exceeded the memory budget at '{attr}': "
+                f"{format_size(total)} > {format_size(max_memory)}"
+            )
+    if info is not None:
+        info["fingerprint"] = fingerprint.hexdigest()
+
+    return DictCache(data)
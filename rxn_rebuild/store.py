@@ -0,0 +1,298 @@
+from logging import (
+    Logger,
+    getLogger,
+)
+from typing import Dict, Iterable, List, Tuple
+from hashlib import sha256
+from json import dumps, loads
+from sqlite3 import Connection, OperationalError, connect
+from rr_cache import rrCache
+from .fingerprint import cache_fingerprint
+
+# Version of the database schema, stores with an older one are reset
+SCHEMA_VERSION = 2
+
+
+def normalize_transfo(transfo: str) -> str:
+    """
+    Normalize a transformation for result lookup (whitespaces).
+    """
+    return " ".join(transfo.split())
+
+
+def _connect(filename: str, timeout: float = 30) -> Connection:
+    # Wait for concurrent writers (other runs sharing the store) to commit
+    db = connect(filename, timeout=timeout)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    if db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        # Results are only a cache, no need to convert them
+        db.execute("DROP TABLE IF EXISTS results")
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS results ("
+        " cspace TEXT NOT NULL,"
+        " key TEXT NOT NULL,"
+        " fingerprint TEXT NOT NULL,"
+        " rxn_rule_id TEXT,"
+        " value TEXT NOT NULL,"
+        " last_used INTEGER NOT NULL,"
+        " PRIMARY KEY (cspace, key))"
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+    db.commit()
+    return db
+
+
+class ResultStore:
+    """
+    Persistent store of completed transformations, shared across runs.
+
+    Results are stored in an SQLite database (WAL mode) and keyed on the
+    chemical space, the reaction rule and template reaction IDs, the
+    normalized transformation and the compounds to ignore, and tagged with
+    the fingerprint of the cache data. Results computed with another version
+    of the cache data are dropped when the store is opened, unless they have
+    been migrated before (see migrate_results). Once 'max_entries' is
+    reached, least recently used results are evicted.
+
+    Several runs can share the same store: results are committed as soon as
+    they are stored, lookups do not write (last uses are recorded by batches
+    of 'commit_every'), and a store still locked by another run after
+    'timeout' seconds is skipped (miss, result not stored) rather than
+    failing the run.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        cache: "rrCache",
+        cspace: str,
+        max_entries: int = None,
+        commit_every: int = 100,
+        timeout: float = 30,
+        fingerprint: str = None,
+        logger: Logger = getLogger(__name__),
+    ):
+        self.filename = filename
+        self.cspace = cspace
+        self.max_entries = max_entries
+        self.commit_every = commit_every
+        self.logger = logger
+        # Given when 'cache' only holds part of the data (see batch.shard_attr)
+        self.fingerprint = fingerprint or cache_fingerprint(cache)
+        self.hits = 0
+        self.misses = 0
+        # Last uses of the results hit, not recorded yet
+        self._used = {}
+
+        self._db = _connect(filename, timeout)
+        # Invalidate results computed with another version of the cache data
+        n = self._db.execute(
+            "DELETE FROM results WHERE cspace = ? AND fingerprint != ?",
+            (cspace, self.fingerprint),
+        ).rowcount
+        if n > 0:
+            logger.info(f"   |- {n} stored results invalidated (cache data changed)")
+        self._db.commit()
+        self._n_entries, self._clock = self._db.execute(
+            "SELECT COUNT(*), COALESCE(MAX(last_used), 0) FROM results"
+        ).fetchone()
+
+    def key(
+        self,
+        rxn_rule_id: str,
+        transfo: str,
+        tmpl_rxn_id: str = None,
+        cmpds_to_ignore: List[str] = [],
+        cspace_type: str = "rr2026",
+    ) -> str:
+        return sha256(
+            dumps(
+                [
+                    cspace_type,
+                    rxn_rule_id,
+                    tmpl_rxn_id,
+                    normalize_transfo(transfo),
+                    sorted(set(cmpds_to_ignore)),
+                ]
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key: str) -> Dict:
+        """
+        Stored result for the key, None if there is none.
+        """
+        try:
+            row = self._db.execute(
+                "SELECT value FROM results"
+                " WHERE cspace = ? AND key = ? AND fingerprint = ?",
+                (self.cspace, key, self.fingerprint),
+            ).fetchone()
+        except OperationalError as e:
+            self.logger.debug(f"   |- result store unavailable ({e})")
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._clock += 1
+        self._used[key] = self._clock
+        if len(self._used) >= self.commit_every:
+            self.commit()
+        return loads(row[0])
+
+    def put(self, key: str, value: Dict, rxn_rule_id: str = None) -> None:
+        """
+        Store a result. The reaction rule ID it depends on is needed for the
+        result to be kept when migrating to another release of the cache data.
+        """
+        self._clock += 1
+        value = dumps(value)
+        try:
+            if self._db.execute(
+                "INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (self.cspace, key, self.fingerprint, rxn_rule_id, value, self._clock),
+            ).rowcount:
+                self._n_entries += 1
+            else:
+                # Possibly computed by a concurrent run with other cache data
+                self._db.execute(
+                    "UPDATE results SET fingerprint = ?, rxn_rule_id = ?, value = ?,"
+                    " last_used = ? WHERE cspace = ? AND key = ?",
+                    (
+                        self.fingerprint,
+                        rxn_rule_id,
+                        value,
+                        self._clock,
+                        self.cspace,
+                        key,
+                    ),
+                )
+            if self.max_entries is not None and self._n_entries > self.max_entries:
+                self._evict()
+            self._db.commit()
+        except OperationalError as e:
+            self._db.rollback()
+            self._n_entries = self._count()
+            self.logger.warning(f"   |- result not stored ({e})")
+
+    def _count(self) -> int:
+        try:
+            return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        except OperationalError:
+            return self._n_entries
+
+    def _evict(self) -> None:
+        # Evict 10% at once, not to evict at every insertion
+        n = self._n_entries - self.max_entries + max(1, self.max_entries // 10)
+        # Results hit since the last commit are not the least recently used
+        self._record_uses()
+        self._db.execute(
+            "DELETE FROM results WHERE rowid IN"
+            " (SELECT rowid FROM results ORDER BY last_used LIMIT ?)",
+            (n,),
+        )
+        self._n_entries = self._count()
+        self.logger.debug(f"   |- {n} stored results evicted")
+
+    def __len__(self) -> int:
+        return self._n_entries
+
+    def commit(self) -> None:
+        """
+        Commit pending writes, along with the last uses of the results hit.
+        """
+        try:
+            self._record_uses()
+            self._db.commit()
+        except OperationalError as e:
+            # Last uses only drive eviction, not worth failing for
+            self._db.rollback()
+            self.logger.debug(f"   |- last uses of stored results not recorded ({e})")
+        self._used = {}
+
+    def _record_uses(self) -> None:
+        self._db.executemany(
+            "UPDATE results SET last_used = ? WHERE cspace = ? AND key = ?",
+            ((clock, self.cspace, key) for key, clock in self._used.items()),
+        )
+        self._used = {}
+
+    def close(self) -> None:
+        self.commit()
+        self._db.close()
+        self.logger.debug(f"   |- result store: {self.hits} hits, {self.misses} misses")
+
+
+def migrate_results(
+    filename: str,
+    old_cspace: str,
+    old_fingerprint: str,
+    new_cspace: str,
+    new_fingerprint: str,
+    affected_rules: Iterable[str],
+    logger: Logger = getLogger(__name__),
+) -> Tuple[int, int]:
+    """
+    Migrate stored results from a release of the cache data to another one.
+    Results depending on the reaction rules affected by the changes are
+    dropped, to be recomputed, and the other ones are kept for the new release.
+
+    Parameters
+    ----------
+    filename: str
+        SQLite file of the result store.
+    old_cspace: str
+        Chemical space the results have been computed with.
+    old_fingerprint: str
+        Fingerprint of the old cache data.
+    new_cspace: str
+        Chemical space to migrate the results to.
+    new_fingerprint: str
+        Fingerprint of the new cache data.
+    affected_rules: Iterable[str]
+        Reaction rules whose results may differ in the new release
+        (see delta.diff_spaces).
+    logger : Logger
+        The logger object.
+
+    Returns
+    -------
+    kept, dropped: Tuple[int, int]
+        Number of results migrated and dropped.
+    """
+    db = _connect(filename)
+    try:
+        if (old_cspace, old_fingerprint) == (new_cspace, new_fingerprint):
+            kept = db.execute(
+                "SELECT COUNT(*) FROM results WHERE cspace = ? AND fingerprint = ?",
+                (new_cspace, new_fingerprint),
+            ).fetchone()[0]
+            return kept, 0
+        db.execute("CREATE TEMP TABLE affected (rxn_rule_id TEXT PRIMARY KEY)")
+        db.executemany(
+            "INSERT OR IGNORE INTO affected VALUES (?)",
+            ((rxn_rule_id,) for rxn_rule_id in affected_rules),
+        )
+        # Results with unknown reaction rule cannot be trusted either
+        dropped = db.execute(
+            "DELETE FROM results WHERE cspace = ? AND fingerprint = ?"
+            " AND (rxn_rule_id IS NULL OR rxn_rule_id IN (SELECT rxn_rule_id FROM affected))",
+            (old_cspace, old_fingerprint),
+        ).rowcount
+        # Results already stored for the new release take precedence
+        kept = db.execute(
+            "UPDATE OR IGNORE results SET cspace = ?, fingerprint = ?"
+            " WHERE cspace = ? AND fingerprint = ?",
+            (new_cspace, new_fingerprint, old_cspace, old_fingerprint),
+        ).rowcount
+        dropped += db.execute(
+            "DELETE FROM results WHERE cspace = ? AND fingerprint = ?",
+            (old_cspace, old_fingerprint),
+        ).rowcount
+        db.commit()
+    finally:
+        db.close()
+    logger.debug(f"   |- {kept} stored results migrated, {dropped} dropped")
+    return kept, dropped
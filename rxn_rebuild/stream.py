@@ -0,0 +1,166 @@
+from logging import (
+    Logger,
+    getLogger,
+)
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Sequence, Tuple
+from collections import deque
+from rr_cache import rrCache
+from .Args import DEFAULTS
+from .batch import chunks, rebuild_row
+from .rxn_rebuild import build_rule_index
+from .shm import attach_cache
+
+if TYPE_CHECKING:
+    from .store import ResultStore
+
+# Per-process state of pool workers, set by _init_worker()
+_WORKER = {}
+
+
+def _init_worker(cache: "rrCache", shm_name: str, options: Dict) -> None:
+    if cache is None:
+        # Either inherited from the parent process (fork)
+        # or attached from shared memory
+        cache = _WORKER.get("cache") or attach_cache(shm_name)
+    _WORKER.update(
+        cache=cache,
+        rule_index=build_rule_index(cache),
+        options=options,
+    )
+
+
+def _rebuild_chunk(chunk: List[Tuple[int, Sequence]]) -> List[Dict]:
+    return [
+        item
+        for i, row in chunk
+        for item in _split_record(
+            rebuild_row(
+                i,
+                row[0],
+                row[1],
+                row[2] if len(row) > 2 and row[2] != "" else None,
+                cache=_WORKER["cache"],
+                rule_index=_WORKER["rule_index"],
+                **_WORKER["options"],
+            )
+        )
+    ]
+
+
+def _split_record(record: Dict) -> Iterator[Dict]:
+    # One item per template reaction, or a single one for rows in error
+    results = record.pop("results")
+    if record["error"] is not None:
+        yield dict(record, result=None)
+        return
+    for tmpl_rxn_id, result in results.items():
+        yield dict(record, tmpl_rxn_id=tmpl_rxn_id, result=result)
+
+
+def iter_rebuild(
+    rows: Iterable[Sequence],
+    cache: "rrCache" = None,
+    cmpds_to_ignore: List[str] = [],
+    cspace: str = DEFAULTS["cspace"],
+    cspace_type: str = DEFAULTS["cspace_type"],
+    shm_name: str = None,
+    chunk_size: int = 1000,
+    workers: int = 0,
+    prefetch: int = 2,
+    store: "ResultStore" = None,
+    logger: Logger = getLogger(__name__),
+) -> Iterator[Dict]:
+    """
+    Complete transformations lazily, one item per (row, template reaction).
+
+    Rows are read by chunks of 'chunk_size', and at most 'prefetch' chunks
+    per worker are in flight at any time, so that memory does not depend
+    on the number of rows.
+
+    Parameters
+    ----------
+    rows: Iterable[Sequence]
+        (rxn_rule_id, transfo) or (rxn_rule_id, transfo, tmpl_rxn_id) rows.
+    cache: rrCache
+        Loaded cache. If None, attached from shared memory if 'shm_name' is
+        given, loaded from 'cspace' otherwise.
+    cmpds_to_ignore: List[str]
+        List of compounds to ignore.
+    cspace: str
+        Chemical space to load if no cache is provided.
+    cspace_type: str
+        Type of chemical space ('legacy' or not).
+    shm_name: str
+        Name of a cache published in shared memory.
+    chunk_size: int
+        Number of rows read and processed at once.
+    workers: int
+        Number of worker processes, 0 to complete in the calling process.
+    prefetch: int
+        Number of chunks submitted ahead, per worker.
+    store: ResultStore
+        Persistent result store (only without workers).
+    logger : Logger
+        The logger object.
+
+    Returns
+    -------
+    items: Iterator[Dict]
+        Items, in input order, with 'row', 'rxn_rule_id', 'transfo',
+        'tmpl_rxn_id', 'error' and 'result' (completed transformation,
+        None if 'error') keys.
+    """
+    if workers > 0 and store is not None:
+        raise ValueError("A result store cannot be shared by workers")
+    if cache is None and shm_name is not None:
+        cache = attach_cache(shm_name, logger=logger)
+    if cache is None:
+        cache = rrCache(cspace=cspace, interactive=False, logger=logger)
+
+    options = {
+        "cmpds_to_ignore": cmpds_to_ignore,
+        "cspace_type": cspace_type,
+    }
+
+    if workers == 0:
+        rule_index = build_rule_index(cache)
+        for chunk in chunks(rows, chunk_size):
+            for i, row in chunk:
+                yield from _split_record(
+                    rebuild_row(
+                        i,
+                        row[0],
+                        row[1],
+                        row[2] if len(row) > 2 and row[2] != "" else None,
+                        cache=cache,
+                        rule_index=rule_index,
+                        store=store,
+                        logger=logger,
+                        **options,
+                    )
+                )
+        return
+
+    from multiprocessing import get_context
+
+    ctx = get_context()
+    if ctx.get_start_method() == "fork":
+        # Workers inherit the cache, nothing to pickle
+        _WORKER["cache"] = cache
+        initargs = (None, shm_name, options)
+    elif shm_name is not None:
+        initargs = (None, shm_name, options)
+    else:
+        initargs = (cache, None, options)
+
+    pending = deque()
+    try:
+        with ctx.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+            for chunk in chunks(rows, chunk_size):
+                pending.append(pool.apply_async(_rebuild_chunk, (chunk,)))
+                if len(pending) >= prefetch * workers:
+                    yield from pending.popleft().get()
+            while pending:
+                yield from pending.popleft().get()
+    finally:
+        _WORKER.clear()
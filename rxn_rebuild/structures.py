@@ -0,0 +1,176 @@
+from logging import (
+    Logger,
+    getLogger,
+)
+from typing import Dict, Iterable, List
+from rr_cache import rrCache
+
+# Structure formats, as keys of cid_strc entries
+STRUCTURE_FORMATS = ("smiles", "inchi", "inchikey")
+
+
+class StructureLookup:
+    """
+    Structures of compounds, looked up in cid_strc once per compound and
+    kept for the whole run, to be shared by all completed transformations.
+    """
+
+    def __init__(
+        self,
+        cache: "rrCache",
+        fmt: str = "smiles",
+        logger: Logger = getLogger(__name__),
+    ):
+        if fmt not in STRUCTURE_FORMATS:
+            raise ValueError(
+                f"Invalid structure format '{fmt}', expected one of {STRUCTURE_FORMATS}"
+            )
+        self.cid_strc = cache.get("cid_strc")
+        self.fmt = fmt
+        self.logger = logger
+        self.structures = {}
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, cids: Iterable[str]) -> None:
+        """
+        Look up, in one pass, the structures of compounds not resolved yet.
+        """
+        for cid in cids:
+            if cid in self.structures:
+                self.hits += 1
+                continue
+            self.misses += 1
+            strc = (self.cid_strc.get(cid) or {}).get(self.fmt)
+            self.structures[cid] = strc if strc else None
+
+    def get(self, cid: str) -> str:
+        """
+        Structure of a compound, None if it has no structure.
+        """
+        if cid not in self.structures:
+            self.resolve([cid])
+        return self.structures[cid]
+
+    def __len__(self) -> int:
+        return len(self.structures)
+
+
+def _compounds_to_resolve(result: Dict) -> Iterable[str]:
+    # Compounds of a SMILES transformation are structures already,
+    # only the added ones are IDs
+    smiles_input = result["sep_side"] == ">>"
+    for side in ("left", "right"):
+        for cmpd in result["full_transfo"][side]:
+            if not smiles_input or cmpd in result["added_cmpds"][side]:
+                yield cmpd
+
+
+def add_structures(result: Dict, lookup: StructureLookup) -> Dict:
+    """
+    Add the structures of all compounds to a completed transformation.
+
+    Parameters
+    ----------
+    result: Dict
+        Completed transformation (see complete_transfo).
+    lookup: StructureLookup
+        Resolved compound structures.
+
+    Returns
+    -------
+    result: Dict
+        The completed transformation, with 'structures' (structure and
+        stoichiometric coefficient per side), 'nostruct' (list of compounds
+        with no structure, with 'cid', 'side' and 'stoichio' keys),
+        'unconverted' (list of compounds of a SMILES transformation, when
+        structures are not in SMILES, with 'smiles', 'side' and 'stoichio'
+        keys) and 'struct_transfo' (SMILES reaction, None if some compounds
+        have no structure or a non integer coefficient, or if not in SMILES)
+        keys.
+    """
+    smiles_input = result["sep_side"] == ">>"
+    structures = {}
+    nostruct = []
+    unconverted = []
+    for side in ("left", "right"):
+        structures[side] = {}
+        for cmpd, coeff in result["full_transfo"][side].items():
+            if smiles_input and cmpd not in result["added_cmpds"][side]:
+                if lookup.fmt != "smiles":
+                    # Structure given as SMILES, not an ID to look up
+                    unconverted.append(
+                        {"smiles": cmpd, "side": side, "stoichio": coeff}
+                    )
+                    continue
+                strc = cmpd
+            else:
+                strc = lookup.get(cmpd)
+            if strc is None:
+                nostruct.append({"cid": cmpd, "side": side, "stoichio": coeff})
+                continue
+            structures[side][strc] = structures[side].get(strc, 0) + coeff
+
+    struct_transfo = None
+    if (
+        lookup.fmt == "smiles"
+        and not nostruct
+        and all(
+            float(coeff).is_integer()
+            for side in structures.values()
+            for coeff in side.values()
+        )
+    ):
+        struct_transfo = ">>".join(
+            ".".join(
+                strc
+                for strc, coeff in structures[side].items()
+                for _ in range(int(coeff))
+            )
+            for side in ("left", "right")
+        )
+
+    result["structures"] = structures
+    result["nostruct"] = nostruct
+    result["unconverted"] = unconverted
+    result["struct_transfo"] = struct_transfo
+    return result
+
+
+def add_batch_structures(
+    records: List[Dict],
+    lookup: StructureLookup,
+    logger: Logger = getLogger(__name__),
+) -> List[Dict]:
+    """
+    Add structures to the completed transformations of a batch of records,
+    all added compounds of the batch being looked up at once first.
+
+    Parameters
+    ----------
+    records: List[Dict]
+        Records with 'results' (completed transformations per template reaction).
+    lookup: StructureLookup
+        Shared compound structures, filled with the compounds of the batch.
+    logger : Logger
+        The logger object.
+
+    Returns
+    -------
+    records: List[Dict]
+        The same records, completed transformations being updated in place
+        (see add_structures).
+    """
+    results = [
+        result for record in records for result in (record["results"] or {}).values()
+    ]
+    n = len(lookup)
+    lookup.resolve(
+        {cmpd for result in results for cmpd in _compounds_to_resolve(result)}
+    )
+    for result in results:
+        add_structures(result, lookup)
+    logger.debug(
+        f"   |- {len(results)} completed transformations, {len(lookup) - n} new compounds looked up"
+    )
+    return records
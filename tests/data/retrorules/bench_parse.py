@@ -0,0 +1,42 @@
+"""
+Benchmark of the bulk transformation parser against Reaction.parse().
+
+Usage: python tests/data/retrorules/bench_parse.py <retrorules_flat_file.tsv> [<repeat>]
+"""
+
+import sys
+from logging import getLogger, ERROR
+from timeit import default_timer as timer
+from chemlite import Reaction
+from rxn_rebuild.parser import parse_transfos
+
+filename = sys.argv[1]
+repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+sep = "\t"
+logger = getLogger(__name__)
+logger.setLevel(ERROR)
+
+with open(filename, "r") as f:
+    lines = f.readlines()
+transfos = [
+    row[7] + ">>" + row[9] for row in (line.split(sep) for line in lines[1:])
+] * repeat
+
+start = timer()
+ref = [Reaction.parse(transfo, logger) for transfo in transfos]
+t_ref = timer() - start
+
+start = timer()
+bulk = parse_transfos(transfos, logger)
+t_bulk = timer() - start
+
+n_diff = sum(
+    1
+    for r, b in zip(ref, bulk)
+    if b is None
+    or any(r[key] != b[key] for key in ["left", "right", "sep_side", "sep_cmpd"])
+)
+print(f"{len(transfos)} transformations")
+print(f"Reaction.parse: {t_ref:.3f}s")
+print(f"parse_transfos: {t_bulk:.3f}s (x{t_ref / t_bulk:.1f})")
+print(f"Differences: {n_diff}")
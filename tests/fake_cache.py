@@ -0,0 +1,61 @@
+"""
+In-memory stand-in for rrCache, holding one new-style (rr2026) rule.
+"""
+
+from copy import deepcopy
+
+RULE_ID = "RR:03-6A67ED-190DBF-97D570"
+TMPL_RXN_ID = "RHEA:67404"
+TRANSFO = "Cc1ccc(C(C)C)cc1O>>CC1=CCC(C(C)C)=CC1.O=O"
+
+DATA = {
+    "rr_reactions": {
+        RULE_ID: {
+            TMPL_RXN_ID: {
+                "left": {"CHEBI:3440": 1},
+                "left_excluded": [
+                    "CHEBI:15377",
+                    "CHEBI:15377",
+                    "CHEBI:15377",
+                    "CHEBI:15378",
+                    "CHEBI:15378",
+                    "CHEBI:58210",
+                    "CHEBI:58210",
+                ],
+                "reac_id": TMPL_RXN_ID,
+                "rel_direction": -1,
+                "right": {"CHEBI:10577": 1, "CHEBI:15379": 1},
+                "right_excluded": ["CHEBI:15379", "CHEBI:57618", "CHEBI:57618"],
+                "rule_id": RULE_ID,
+                "rule_score": 1.0,
+                "subs_id": "CHEBI:3440",
+            }
+        }
+    },
+    "template_reactions": {
+        TMPL_RXN_ID: {
+            "direction": 0,
+            "left": {"CHEBI:10577": 1, "CHEBI:15379": 2, "CHEBI:57618": 2},
+            "main_left": "CHEBI:10577",
+            "main_right": "CHEBI:3440",
+            "right": {
+                "CHEBI:15377": 3,
+                "CHEBI:15378": 2,
+                "CHEBI:3440": 1,
+                "CHEBI:58210": 2,
+            },
+        }
+    },
+    "cid_strc": {
+        "CHEBI:15377": {"smiles": "[H]O[H]", "inchi": "InChI=1S/H2O/h1H2"},
+        "CHEBI:15379": {"smiles": "O=O", "inchi": "InChI=1S/O2/c1-2"},
+    },
+}
+
+
+class FakeCache:
+    def __init__(self, data=DATA):
+        self.data = deepcopy(data)
+
+    def get(self, attr):
+        return self.data[attr]
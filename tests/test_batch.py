@@ -0,0 +1,198 @@
+"""
+Created on Oct 18 2026
+"""
+
+from unittest import TestCase
+from unittest.mock import patch
+from copy import deepcopy
+from logging import getLogger
+from os import path as os_path
+from tempfile import TemporaryDirectory
+from json import loads as json_loads
+from rxn_rebuild.rxn_rebuild import (
+    Reaction,
+    rebuild_rxn,
+    build_rule_index,
+    ERR_UNKNOWN_RULE,
+    ERR_UNKNOWN_TMPL,
+    ERR_PARSE,
+)
+from rxn_rebuild.batch import (
+    read_rows,
+    rebuild_batch,
+    run_batch,
+    parse_shard,
+    shard_cache,
+    shard_of,
+    merge_shards,
+)
+from rxn_rebuild.__main__ import merge_entry_point
+from fake_cache import DATA, FakeCache, RULE_ID, TMPL_RXN_ID, TRANSFO
+
+
+class Test(TestCase):
+
+    cache = FakeCache()
+
+    def test_rule_index(self):
+        rule_index = build_rule_index(self.cache)
+        self.assertIn(RULE_ID, rule_index["rules"])
+        self.assertIn((RULE_ID, TMPL_RXN_ID), rule_index["rule_templates"])
+        self.assertEqual(
+            rebuild_rxn(
+                rxn_rule_id="RR-unknown",
+                transfo="not a transformation",
+                cache=self.cache,
+                rule_index=rule_index,
+            ),
+            {},
+        )
+
+    def test_rebuild_batch(self):
+        rows = [
+            (RULE_ID, TRANSFO, None),
+            ("RR-unknown", TRANSFO, None),
+            (RULE_ID, TRANSFO, "RHEA:unknown"),
+            (RULE_ID, TRANSFO, TMPL_RXN_ID),
+        ]
+        records = list(rebuild_batch(rows, cache=self.cache))
+        self.assertEqual([r["row"] for r in records], [0, 1, 2, 3])
+        self.assertEqual(
+            [r["error"] for r in records],
+            [None, ERR_UNKNOWN_RULE, ERR_UNKNOWN_TMPL, None],
+        )
+        self.assertEqual(records[1]["results"], {})
+        self.assertEqual(
+            records[0]["results"][TMPL_RXN_ID]["added_cmpds"]["right"],
+            {"CHEBI:15379": 1, "CHEBI:57618": 2},
+        )
+
+    def test_parse_error(self):
+        rows = [(RULE_ID, "not a transformation", None), (RULE_ID, TRANSFO, None)]
+        for plan in (False, True):
+            for bulk_parse in (False, True):
+                summary = {}
+                records = list(
+                    rebuild_batch(
+                        rows,
+                        cache=self.cache,
+                        plan=plan,
+                        bulk_parse=bulk_parse,
+                        summary=summary,
+                    )
+                )
+                self.assertEqual([r["error"] for r in records], [ERR_PARSE, None])
+                self.assertEqual(records[0]["results"], {})
+                self.assertEqual(summary["errors"], {ERR_PARSE: 1})
+
+    def test_bulk_parse_error(self):
+        rows = [(RULE_ID, "not a transformation", None), (RULE_ID, TRANSFO, None)]
+        for plan in (False, True):
+            with patch.object(Reaction, "parse", wraps=Reaction.parse) as parse:
+                records = list(
+                    rebuild_batch(rows, cache=self.cache, plan=plan, bulk_parse=True)
+                )
+            self.assertEqual([r["error"] for r in records], [ERR_PARSE, None])
+            # Not parsed again
+            parse.assert_not_called()
+
+    def test_template_of_another_rule(self):
+        # Template reaction known in the cache but not one of the rule
+        data = deepcopy(DATA)
+        data["template_reactions"]["RHEA:other"] = data["template_reactions"][
+            TMPL_RXN_ID
+        ]
+        cache = FakeCache(data)
+        logger = getLogger("test_batch")
+        with self.assertLogs(logger, level="DEBUG") as logs:
+            records = list(
+                rebuild_batch(
+                    [(RULE_ID, TRANSFO, "RHEA:other")], cache=cache, logger=logger
+                )
+            )
+        self.assertEqual(records[0]["error"], ERR_UNKNOWN_TMPL)
+        self.assertFalse([line for line in logs.output if line.startswith("ERROR")])
+
+    def test_read_write(self):
+        with TemporaryDirectory() as tmpdir:
+            infile = os_path.join(tmpdir, "in.tsv")
+            with open(infile, "w") as f:
+                f.write(f"# comment\n{RULE_ID}\t{TRANSFO}\n\n")
+                f.write(f"{RULE_ID}\t{TRANSFO}\t{TMPL_RXN_ID}\n")
+            rows = list(read_rows(infile))
+            self.assertEqual(
+                rows, [(RULE_ID, TRANSFO, None), (RULE_ID, TRANSFO, TMPL_RXN_ID)]
+            )
+            outfile = os_path.join(tmpdir, "out.jsonl")
+            self.assertEqual(run_batch(infile, outfile, cache=self.cache), 2)
+            with open(outfile) as f:
+                records = [json_loads(line) for line in f]
+            self.assertEqual(records[1]["tmpl_rxn_id"], TMPL_RXN_ID)
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("1/4"), (1, 4))
+        for shard in ["4/4", "-1/4", "1/0", "1", "a/b"]:
+            with self.assertRaises(ValueError):
+                parse_shard(shard)
+
+    def test_shards_merge(self):
+        rows = [(RULE_ID, TRANSFO, None)] + [
+            (f"RR-unknown-{i}", TRANSFO, None) for i in range(10)
+        ]
+        expected = list(rebuild_batch(rows, cache=self.cache))
+        n_shards = 3
+        for i in range(n_shards):
+            rr_reactions = shard_cache(self.cache, (i, n_shards)).get("rr_reactions")
+            self.assertEqual(RULE_ID in rr_reactions, shard_of(RULE_ID, n_shards) == i)
+        with TemporaryDirectory() as tmpdir:
+            infile = os_path.join(tmpdir, "in.tsv")
+            with open(infile, "w") as f:
+                f.writelines(f"{row[0]}\t{row[1]}\n" for row in rows)
+            filenames = []
+            for i in range(n_shards):
+                filename = os_path.join(tmpdir, f"shard_{i}.jsonl")
+                run_batch(
+                    infile,
+                    filename,
+                    cache=shard_cache(self.cache, (i, n_shards)),
+                    shard=(i, n_shards),
+                )
+                filenames.append(filename)
+            outfile = os_path.join(tmpdir, "merged.jsonl")
+            self.assertEqual(merge_shards(filenames[::-1], outfile), len(rows))
+            with open(outfile) as f:
+                self.assertEqual([json_loads(line) for line in f], expected)
+            # Missing and duplicated shards
+            with self.assertRaises(ValueError):
+                merge_shards(filenames[1:], outfile)
+            with self.assertRaises(ValueError):
+                merge_shards(filenames + filenames[:1], outfile)
+            # Missing row: the previous output is left untouched
+            with open(filenames[0]) as f:
+                lines = f.readlines()
+            with open(filenames[0], "w") as f:
+                f.writelines(lines[1:])
+            with self.assertRaises(ValueError):
+                merge_shards(filenames, outfile)
+            with open(outfile) as f:
+                self.assertEqual(len(f.readlines()), len(rows))
+            self.assertFalse(os_path.exists(outfile + ".tmp"))
+            # Shard of another input with as many rows
+            with open(filenames[0], "w") as f:
+                f.writelines(lines)
+            self.assertEqual(merge_shards(filenames, outfile), len(rows))
+            otherfile = os_path.join(tmpdir, "other.tsv")
+            with open(otherfile, "w") as f:
+                f.writelines(f"{row[0]}\t{row[1]} \n" for row in rows)
+            run_batch(
+                otherfile,
+                filenames[1],
+                cache=shard_cache(self.cache, (1, n_shards)),
+                shard=(1, n_shards),
+            )
+            with self.assertRaisesRegex(ValueError, "different runs"):
+                merge_shards(filenames, outfile)
+            # Failed merges exit non-zero
+            with self.assertRaises(SystemExit) as cm:
+                merge_entry_point([outfile] + filenames[1:])
+            self.assertEqual(cm.exception.code, 1)
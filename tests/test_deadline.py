@@ -0,0 +1,62 @@
+"""
+Created on Oct 18 2026
+"""
+
+from unittest import TestCase
+from unittest.mock import patch
+from copy import deepcopy
+from rxn_rebuild.rxn_rebuild import rebuild_rxn, order_templates
+from fake_cache import DATA, FakeCache, RULE_ID, TMPL_RXN_ID, TRANSFO
+
+
+class Test(TestCase):
+
+    def setUp(self):
+        # Generic rule with several template reactions
+        data = deepcopy(DATA)
+        rr_reactions = data["rr_reactions"][RULE_ID]
+        for i, score in enumerate([0.2, 0.9, 0.5]):
+            tmpl_rxn_id = f"RHEA:{i}"
+            rr_reactions[tmpl_rxn_id] = dict(
+                rr_reactions[TMPL_RXN_ID], rule_score=score
+            )
+            data["template_reactions"][tmpl_rxn_id] = data["template_reactions"][
+                TMPL_RXN_ID
+            ]
+        self.cache = FakeCache(data)
+
+    def test_order_templates(self):
+        self.assertEqual(
+            order_templates(self.cache.get("rr_reactions")[RULE_ID]),
+            [TMPL_RXN_ID, "RHEA:1", "RHEA:2", "RHEA:0"],
+        )
+
+    def test_max_templates(self):
+        status = {}
+        completed_transfos = rebuild_rxn(
+            RULE_ID, TRANSFO, cache=self.cache, max_templates=2, status=status
+        )
+        self.assertEqual(list(completed_transfos), [TMPL_RXN_ID, "RHEA:1"])
+        self.assertEqual(status, {"partial": True, "skipped": 2})
+
+    def test_deadline(self):
+        status = {}
+        self.assertEqual(
+            rebuild_rxn(RULE_ID, TRANSFO, cache=self.cache, deadline=0, status=status),
+            {},
+        )
+        self.assertEqual(status, {"partial": True, "skipped": 4})
+        completed_transfos = rebuild_rxn(
+            RULE_ID, TRANSFO, cache=self.cache, deadline=60, status=status
+        )
+        self.assertEqual(status, {"partial": False, "skipped": 0})
+        self.assertEqual(
+            completed_transfos, rebuild_rxn(RULE_ID, TRANSFO, cache=self.cache)
+        )
+
+    def test_rule_fetched_once(self):
+        with patch.object(self.cache, "get", wraps=self.cache.get) as get:
+            rebuild_rxn(RULE_ID, TRANSFO, cache=self.cache, deadline=60)
+        self.assertEqual(
+            [call.args[0] for call in get.call_args_list].count("rr_reactions"), 1
+        )
@@ -0,0 +1,82 @@
+"""
+Created on Oct 18 2026
+"""
+
+from unittest import TestCase
+from copy import deepcopy
+from os import path as os_path
+from tempfile import TemporaryDirectory
+from rxn_rebuild.rxn_rebuild import rebuild_rxn
+from rxn_rebuild.delta import diff_spaces
+from rxn_rebuild.fingerprint import cache_fingerprint
+from rxn_rebuild.store import ResultStore, migrate_results
+from fake_cache import DATA, FakeCache, RULE_ID, TMPL_RXN_ID, TRANSFO
+
+OTHER_RULE_ID = "RR:03-000000-000000-000000"
+OTHER_TMPL_RXN_ID = "RHEA:00000"
+
+
+class Test(TestCase):
+
+    def setUp(self):
+        # Old release with a second rule, from another template reaction
+        data = deepcopy(DATA)
+        rxn_rule = dict(
+            data["rr_reactions"][RULE_ID][TMPL_RXN_ID],
+            rule_id=OTHER_RULE_ID,
+            reac_id=OTHER_TMPL_RXN_ID,
+        )
+        data["rr_reactions"][OTHER_RULE_ID] = {OTHER_TMPL_RXN_ID: rxn_rule}
+        data["template_reactions"][OTHER_TMPL_RXN_ID] = deepcopy(
+            data["template_reactions"][TMPL_RXN_ID]
+        )
+        self.old_cache = FakeCache(data)
+        # New release: the template reaction of the second rule changed,
+        # a compound structure changed and a rule has been added
+        data = deepcopy(data)
+        data["template_reactions"][OTHER_TMPL_RXN_ID]["direction"] = 1
+        data["cid_strc"]["CHEBI:15377"]["smiles"] = "O"
+        data["rr_reactions"]["RR:new"] = {}
+        self.new_cache = FakeCache(data)
+
+    def test_diff_spaces(self):
+        diff = diff_spaces(self.old_cache, self.new_cache)
+        self.assertEqual(
+            diff["rr_reactions"], {"added": ["RR:new"], "removed": [], "changed": []}
+        )
+        self.assertEqual(
+            diff["template_reactions"],
+            {"added": [], "removed": [], "changed": [OTHER_TMPL_RXN_ID]},
+        )
+        self.assertEqual(diff["affected_rules"], [OTHER_RULE_ID])
+        self.assertEqual(
+            diff_spaces(self.old_cache, self.old_cache)["affected_rules"], []
+        )
+
+    def test_migrate_results(self):
+        with TemporaryDirectory() as tmpdir:
+            filename = os_path.join(tmpdir, "store.sqlite")
+            store = ResultStore(filename, cache=self.old_cache, cspace="old")
+            for rxn_rule_id in [RULE_ID, OTHER_RULE_ID]:
+                rebuild_rxn(rxn_rule_id, TRANSFO, cache=self.old_cache, store=store)
+            store.close()
+
+            kept, dropped = migrate_results(
+                filename,
+                old_cspace="old",
+                old_fingerprint=cache_fingerprint(self.old_cache),
+                new_cspace="new",
+                new_fingerprint=cache_fingerprint(self.new_cache),
+                affected_rules=diff_spaces(self.old_cache, self.new_cache)[
+                    "affected_rules"
+                ],
+            )
+            self.assertEqual((kept, dropped), (1, 1))
+
+            # Only the result of the affected rule is recomputed
+            store = ResultStore(filename, cache=self.new_cache, cspace="new")
+            self.assertEqual(len(store), 1)
+            for rxn_rule_id in [RULE_ID, OTHER_RULE_ID]:
+                rebuild_rxn(rxn_rule_id, TRANSFO, cache=self.new_cache, store=store)
+            self.assertEqual((store.hits, store.misses), (1, 1))
+            store.close()
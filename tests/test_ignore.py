@@ -0,0 +1,90 @@
+"""
+Created on Oct 18 2026
+"""
+
+from unittest import TestCase
+from os import path as os_path
+from pickle import dumps, loads
+from logging import getLogger
+from collections import Counter
+from rxn_rebuild.rxn_rebuild import detect_missing_compounds
+from rxn_rebuild.batch import rebuild_batch
+from rxn_rebuild.ignore import (
+    PRESETS,
+    IgnoreSet,
+    compile_ignore,
+    log_ignored,
+    read_ignore_tokens,
+)
+from fake_cache import FakeCache, RULE_ID, TRANSFO
+
+here_path = os_path.dirname(os_path.realpath(__file__))
+data_path = os_path.join(here_path, "data")
+
+
+class Test(TestCase):
+
+    def test_read_ignore_tokens(self):
+        self.assertEqual(
+            tuple(read_ignore_tokens(os_path.join(data_path, "to_ignore.txt"))),
+            PRESETS["mnx_cofactors"],
+        )
+        self.assertEqual(read_ignore_tokens(None), [])
+
+    def test_compile_ignore(self):
+        cmpds_to_ignore = compile_ignore(
+            ["MNXM4", "@water", "CHEBI:1537?"], cache=FakeCache()
+        )
+        self.assertIsInstance(cmpds_to_ignore, IgnoreSet)
+        # CHEBI:15378 only appears in template reactions
+        self.assertEqual(
+            cmpds_to_ignore,
+            {"MNXM4", "MNXM2", "WATER", "CHEBI:15377", "CHEBI:15378", "CHEBI:15379"},
+        )
+
+    def test_compile_errors(self):
+        self.assertRaises(ValueError, compile_ignore, ["@unknown"])
+        # Patterns cannot be resolved without cache
+        self.assertRaises(ValueError, compile_ignore, ["MNXM*"])
+
+    def test_counts(self):
+        cmpds_to_ignore = compile_ignore(["MNXM4", "MNXM1"])
+        tmpl_rxn = {"left": {"MNXM4": 1, "MNXM10": 1}, "right": {"MNXM1": 2}}
+        rxn_rule = {"left": {}, "right": {}}
+        ignored = Counter()
+        missing_compounds = detect_missing_compounds(
+            tmpl_rxn, rxn_rule, {}, cmpds_to_ignore=cmpds_to_ignore, ignored=ignored
+        )
+        self.assertEqual(missing_compounds, {"left": {"MNXM10": 1}, "right": {}})
+        self.assertEqual(ignored, {"MNXM4": 1, "MNXM1": 1})
+        for _ in range(3):
+            cmpds_to_ignore.counts.update(ignored)
+        logger = getLogger("test_ignore")
+        with self.assertLogs(logger, level="INFO") as logs:
+            log_ignored(cmpds_to_ignore, logger=logger)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("6 compounds ignored (2 distinct)", logs.output[0])
+
+    def test_batch_counts(self):
+        # Counted per completed transformation, whatever the planning
+        rows = [(RULE_ID, TRANSFO, None)] * 6
+        for plan in (False, True):
+            cmpds_to_ignore = compile_ignore(["CHEBI:15377"])
+            records = list(
+                rebuild_batch(
+                    rows,
+                    cache=FakeCache(),
+                    cmpds_to_ignore=cmpds_to_ignore,
+                    cspace_type="legacy",
+                    plan=plan,
+                )
+            )
+            self.assertEqual([r["error"] for r in records], [None] * 6)
+            self.assertEqual(cmpds_to_ignore.counts, {"CHEBI:15377": 6})
+
+    def test_pickle(self):
+        cmpds_to_ignore = compile_ignore(["MNXM4"])
+        cmpds_to_ignore.counts["MNXM4"] += 1
+        _cmpds_to_ignore = loads(dumps(cmpds_to_ignore))
+        self.assertEqual(_cmpds_to_ignore, cmpds_to_ignore)
+        self.assertEqual(_cmpds_to_ignore.counts, {})
@@ -0,0 +1,77 @@
+"""
+Created on Oct 18 2026
+"""
+
+from unittest import TestCase
+from os import (
+    remove,
+    path as os_path,
+)
+from tempfile import TemporaryDirectory
+from rxn_rebuild.batch import run_batch
+from rxn_rebuild.journal import JournalError, JournalMismatchError
+from fake_cache import FakeCache, RULE_ID, TMPL_RXN_ID, TRANSFO
+
+
+class Test(TestCase):
+
+    cache = FakeCache()
+    rows = [(RULE_ID, TRANSFO, TMPL_RXN_ID), ("RR-unknown", TRANSFO, "")] * 5
+
+    def run_batch(self, tmpdir, **kwargs):
+        infile = os_path.join(tmpdir, "in.tsv")
+        if not os_path.exists(infile):
+            with open(infile, "w") as f:
+                f.writelines("\t".join(row) + "\n" for row in self.rows)
+        outfile = os_path.join(tmpdir, "out.jsonl")
+        n = run_batch(infile, outfile, cache=self.cache, **kwargs)
+        with open(outfile) as f:
+            return n, f.read()
+
+    def test_resume(self):
+        with TemporaryDirectory() as tmpdir:
+            expected = self.run_batch(tmpdir)
+        with TemporaryDirectory() as tmpdir:
+            self.assertEqual(
+                self.run_batch(tmpdir, resume=True, checkpoint_every=3), expected
+            )
+            # Already complete
+            self.assertEqual(self.run_batch(tmpdir, resume=True), expected)
+            # Interrupted after the first checkpoint, while writing
+            journal = os_path.join(tmpdir, "out.jsonl.journal")
+            with open(journal) as f:
+                lines = f.readlines()
+            with open(journal, "w") as f:
+                f.writelines(lines[:2])
+                f.write('{"rows": [3,')
+            with open(os_path.join(tmpdir, "out.jsonl"), "a") as f:
+                f.write('{"row": 4, "rxn_rule')
+            self.assertEqual(self.run_batch(tmpdir, resume=True), expected)
+
+    def test_input_changed(self):
+        with TemporaryDirectory() as tmpdir:
+            self.run_batch(tmpdir, resume=True)
+            with open(os_path.join(tmpdir, "in.tsv"), "a") as f:
+                f.write(f"{RULE_ID}\t{TRANSFO}\n")
+            with self.assertRaises(JournalMismatchError):
+                self.run_batch(tmpdir, resume=True)
+
+    def test_empty_journal(self):
+        with TemporaryDirectory() as tmpdir:
+            # Interrupted before the header was written
+            open(os_path.join(tmpdir, "out.jsonl.journal"), "w").close()
+            with self.assertRaises(JournalError):
+                self.run_batch(tmpdir, resume=True)
+
+    def test_output_deleted(self):
+        with TemporaryDirectory() as tmpdir:
+            self.run_batch(tmpdir, resume=True, checkpoint_every=3)
+            journal = os_path.join(tmpdir, "out.jsonl.journal")
+            with open(journal) as f:
+                lines = f.readlines()
+            # Not complete yet
+            with open(journal, "w") as f:
+                f.writelines(lines[:2])
+            remove(os_path.join(tmpdir, "out.jsonl"))
+            with self.assertRaises(JournalError):
+                self.run_batch(tmpdir, resume=True)
@@ -0,0 +1,74 @@
+"""
+Created on Oct 18 2026
+"""
+
+from unittest import TestCase
+from os import path as os_path
+from logging import getLogger
+from chemlite import Reaction
+from rxn_rebuild.parser import parse_transfos
+from rxn_rebuild.batch import rebuild_batch
+from fake_cache import FakeCache, RULE_ID, TRANSFO
+
+HERE = os_path.dirname(os_path.abspath(__file__))
+DATA_PATH = os_path.join(HERE, "data")
+
+
+class Test(TestCase):
+
+    def test_formats(self):
+        self.assertEqual(
+            parse_transfos(
+                [
+                    "[H]O[H].O=O>>2 [H]OO[H]",
+                    "MNXM181 + 2 MNXM4 = MNXM1 + MNXM1 + MNXM1144",
+                    "1.CMPD_0000000003:1.MNXM4=1.TARGET_0000000001",
+                    "not a transformation",
+                ]
+            ),
+            [
+                {
+                    "left": {"[H]O[H]": 1.0, "O=O": 1.0},
+                    "right": {"[H]OO[H]": 2.0},
+                    "format": "smiles",
+                    "sep_side": ">>",
+                    "sep_cmpd": ".",
+                },
+                {
+                    "left": {"MNXM181": 1.0, "MNXM4": 2.0},
+                    "right": {"MNXM1": 2.0, "MNXM1144": 1.0},
+                    "format": "cid",
+                    "sep_side": "=",
+                    "sep_cmpd": "+",
+                },
+                {
+                    "left": {"CMPD_0000000003": 1.0, "MNXM4": 1.0},
+                    "right": {"TARGET_0000000001": 1.0},
+                    "format": "cid",
+                    "sep_side": "=",
+                    "sep_cmpd": "+",
+                },
+                None,
+            ],
+        )
+
+    def test_retrorules(self):
+        with open(
+            os_path.join(DATA_PATH, "retrorules", "100-retrorules_rr02_flat_all.tsv")
+        ) as f:
+            rows = [line.split("\t") for line in f.readlines()[1:]]
+        transfos = [row[7] + ">>" + row[9] for row in rows]
+        for ref, bulk in zip(
+            (Reaction.parse(transfo, getLogger(__name__)) for transfo in transfos),
+            parse_transfos(transfos),
+        ):
+            for key in ["left", "right", "sep_side", "sep_cmpd"]:
+                self.assertEqual(bulk[key], ref[key])
+
+    def test_bulk_parse_batch(self):
+        rows = [(RULE_ID, TRANSFO, None), ("RR-unknown", TRANSFO, None)] * 3
+        cache = FakeCache()
+        self.assertEqual(
+            list(rebuild_batch(rows, cache=cache, bulk_parse=True, chunk_size=4)),
+            list(rebuild_batch(rows, cache=cache)),
+        )
@@ -0,0 +1,57 @@
+"""
+Created on Oct 18 2026
+"""
+
+from unittest import TestCase
+from rxn_rebuild.batch import rebuild_batch
+from rxn_rebuild.planner import plan_rows, update_group_stats
+from fake_cache import FakeCache, RULE_ID, TMPL_RXN_ID, TRANSFO
+
+
+class Test(TestCase):
+
+    cache = FakeCache()
+    rows = [
+        (RULE_ID, TRANSFO, None),
+        ("RR-unknown", TRANSFO, None),
+        (RULE_ID, "CC(C)C1=CC=C(C)C(O)=C1>>CC1=CCC(C(C)C)=CC1.O=O", None),
+        (RULE_ID, TRANSFO, TMPL_RXN_ID),
+        (RULE_ID, TRANSFO, None),
+    ]
+
+    def test_plan_rows(self):
+        groups = plan_rows(list(enumerate(self.rows)))
+        self.assertEqual(
+            groups,
+            {
+                (RULE_ID, None): [0, 2, 4],
+                ("RR-unknown", None): [1],
+                (RULE_ID, TMPL_RXN_ID): [3],
+            },
+        )
+        stats = update_group_stats({}, groups)
+        self.assertEqual(
+            {key: stats[key] for key in ("rows", "groups", "largest", "singletons")},
+            {"rows": 5, "groups": 3, "largest": 3, "singletons": 2},
+        )
+        # Groups planned again in the next chunk are not distinct
+        update_group_stats(stats, {(RULE_ID, None): [0], ("RR-other", None): [1]})
+        self.assertEqual((stats["groups"], stats["distinct"]), (5, 4))
+
+    def test_rebuild_planned(self):
+        summary = {}
+        records = list(
+            rebuild_batch(
+                self.rows, cache=self.cache, plan=True, chunk_size=3, summary=summary
+            )
+        )
+        self.assertEqual(records, list(rebuild_batch(self.rows, cache=self.cache)))
+        self.assertEqual(summary["groups"]["groups"], 4)
+        # Over the run, whatever the chunk size
+        self.assertEqual(summary["groups"]["distinct"], 3)
+        self.assertNotIn("_pairs", summary["groups"])
+        # Compounds to add are resolved once, but not shared between results
+        records[0]["results"][TMPL_RXN_ID]["added_cmpds"]["left"].clear()
+        self.assertNotEqual(
+            records[2]["results"][TMPL_RXN_ID]["added_cmpds"]["left"], {}
+        )
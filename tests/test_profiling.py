@@ -0,0 +1,58 @@
+"""
+Created on Oct 18 2026
+"""
+
+from unittest import TestCase
+from os import path as os_path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from rxn_rebuild.batch import rebuild_batch
+from rxn_rebuild.profiling import profile_call, top_functions, write_collapsed
+from fake_cache import FakeCache, RULE_ID, TRANSFO
+
+
+def busy(duration):
+    end = perf_counter() + duration
+    while perf_counter() < end:
+        pass
+
+
+class Test(TestCase):
+
+    def test_deterministic(self):
+        cache = FakeCache()
+        n, profile = profile_call(
+            lambda: len(list(rebuild_batch([(RULE_ID, TRANSFO, None)] * 10, cache))),
+            mode="deterministic",
+        )
+        self.assertEqual(n, 10)
+        self.assertEqual(profile["unit"], "us")
+        functions = {func for stack in profile["stacks"] for func in stack}
+        for name in ["complete_transfo", "build_final_transfo"]:
+            self.assertTrue(any(func.startswith(name + " ") for func in functions))
+
+    def test_sampling(self):
+        _, profile = profile_call(lambda: busy(0.1), mode="sampling", interval=0.001)
+        self.assertEqual(profile["unit"], "samples")
+        top = top_functions(profile["stacks"], 1)
+        self.assertTrue(top[0]["function"].startswith("busy "))
+
+    def test_invalid_mode(self):
+        self.assertRaises(ValueError, profile_call, lambda: None, mode="other")
+
+    def test_top_functions(self):
+        stacks = {("a", "b"): 3, ("a", "b", "c"): 5, ("a",): 1, ("a", "c"): 2}
+        self.assertEqual(
+            top_functions(stacks, 2),
+            [
+                {"function": "c", "self": 7, "total": 7},
+                {"function": "b", "self": 3, "total": 8},
+            ],
+        )
+
+    def test_write_collapsed(self):
+        with TemporaryDirectory() as tmpdir:
+            filename = os_path.join(tmpdir, "profile.collapsed")
+            write_collapsed({("a", "b"): 3, ("a",): 0}, filename)
+            with open(filename) as f:
+                self.assertEqual(f.read(), "a;b 3\n")
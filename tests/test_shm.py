@@ -0,0 +1,86 @@
+"""
+Created on Oct 18 2026
+"""
+
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+from os import name as os_name
+from uuid import uuid4
+from rxn_rebuild.rxn_rebuild import build_rule_index, rebuild_rxn
+from rxn_rebuild.shm import (
+    attach_cache,
+    publish_cache,
+    unlink_cache,
+    SharedCache,
+    SharedMapping,
+)
+from fake_cache import FakeCache, RULE_ID, TMPL_RXN_ID, TRANSFO
+
+
+@skipIf(os_name != "posix", "needs POSIX shared memory")
+class Test(TestCase):
+
+    cache = FakeCache()
+
+    def setUp(self):
+        self.name = f"rxn_rebuild_{uuid4().hex[:12]}"
+        publish_cache(self.cache, self.name)
+
+    def tearDown(self):
+        unlink_cache(self.name)
+
+    def test_shared_cache(self):
+        shared = SharedCache(self.name)
+        for attr in ("rr_reactions", "template_reactions", "cid_strc"):
+            self.assertEqual(dict(shared.get(attr)), self.cache.get(attr))
+        shared.close()
+
+    def test_shared_mapping(self):
+        data = {f"CMPD_{i}": {"smiles": "C" * (i % 7), "é": i} for i in range(500)}
+        name = f"rxn_rebuild_{uuid4().hex[:12]}"
+        publish_cache(FakeCache({"cid_strc": data}), name, attrs=["cid_strc"])
+        try:
+            shared = SharedCache(name)
+            mapping = shared.get("cid_strc")
+            self.assertIsInstance(mapping, SharedMapping)
+            # Keys looked up in place, without decoding any value
+            with patch("rxn_rebuild.shm.loads") as loads:
+                self.assertEqual(len(mapping), 500)
+                self.assertIn("CMPD_499", mapping)
+                self.assertNotIn("CMPD_500", mapping)
+            loads.assert_not_called()
+            self.assertEqual(mapping["CMPD_42"], data["CMPD_42"])
+            self.assertNotIn(42, mapping)
+            self.assertRaises(KeyError, mapping.__getitem__, "CMPD_")
+            self.assertEqual(sorted(mapping), sorted(data))
+            shared.close()
+        finally:
+            unlink_cache(name)
+
+    def test_rebuild_rxn_shm(self):
+        self.assertEqual(
+            rebuild_rxn(rxn_rule_id=RULE_ID, transfo=TRANSFO, shm_name=self.name),
+            rebuild_rxn(rxn_rule_id=RULE_ID, transfo=TRANSFO, cache=self.cache),
+        )
+
+    def test_rule_index(self):
+        shared = SharedCache(self.name)
+        with patch("rxn_rebuild.shm.loads", side_effect=AssertionError) as loads:
+            rule_index = build_rule_index(shared)
+            self.assertIn(RULE_ID, rule_index["rules"])
+            self.assertIn((RULE_ID, TMPL_RXN_ID), rule_index["rule_templates"])
+            self.assertNotIn((RULE_ID, "RHEA:unknown"), rule_index["rule_templates"])
+            self.assertNotIn(("RR-unknown", TMPL_RXN_ID), rule_index["rule_templates"])
+        # No rule decoded
+        loads.assert_not_called()
+        shared.close()
+
+    def test_unlink_attached(self):
+        name = f"rxn_rebuild_{uuid4().hex[:12]}"
+        publish_cache(self.cache, name)
+        rr_reactions = attach_cache(name).get("rr_reactions")
+        self.assertIn(RULE_ID, rr_reactions)
+        unlink_cache(name)
+        # Attached cache closed along, the block being released
+        with self.assertRaises(ValueError):
+            rr_reactions[RULE_ID]
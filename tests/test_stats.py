@@ -0,0 +1,92 @@
+"""
+Created on Oct 18 2026
+"""
+
+from unittest import TestCase
+from unittest.mock import patch
+from rxn_rebuild.stats import (
+    MemoryBudgetError,
+    cache_stats,
+    deep_size,
+    load_budgeted_cache,
+    load_measured_cache,
+    parse_size,
+)
+from rxn_rebuild.batch import shard_cache
+from rxn_rebuild.fingerprint import cache_fingerprint
+from fake_cache import FakeCache
+
+
+class Test(TestCase):
+
+    cache = FakeCache()
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size("1024"), 1024)
+        self.assertEqual(parse_size("512M"), 512 << 20)
+        self.assertEqual(parse_size("1.5g"), 3 << 29)
+        with self.assertRaises(ValueError):
+            parse_size("a lot")
+
+    def test_cache_stats(self):
+        stats = cache_stats(self.cache)
+        self.assertEqual(stats["cid_strc"]["entries"], 2)
+        self.assertGreater(
+            stats["rr_reactions"]["deep_size"], deep_size(["CHEBI:15377"])
+        )
+
+    @patch("rxn_rebuild.stats.rrCache")
+    def test_load_measured_cache(self, mock_rrCache):
+        mock_rrCache.side_effect = lambda **kwargs: FakeCache()
+        cache, stats = load_measured_cache("test")
+        self.assertEqual(
+            cache.get("template_reactions"), self.cache.get("template_reactions")
+        )
+        self.assertEqual(
+            set(stats["rr_reactions"]), {"entries", "deep_size", "traced", "rss"}
+        )
+        with self.assertRaises(MemoryBudgetError):
+            load_measured_cache("test", max_memory=1)
+        # Fails before loading anything
+        mock_rrCache.reset_mock()
+        with self.assertRaises(MemoryBudgetError):
+            load_measured_cache(
+                "test",
+                max_memory=1 << 20,
+                estimates={"rr_reactions": {"traced": 1 << 30}},
+            )
+        mock_rrCache.assert_not_called()
+
+    @patch("rxn_rebuild.stats.tracemalloc")
+    @patch("rxn_rebuild.stats._rss")
+    @patch("rxn_rebuild.stats.rrCache")
+    def test_load_budgeted_cache(self, mock_rrCache, mock_rss, mock_tracemalloc):
+        mock_rrCache.side_effect = lambda **kwargs: FakeCache()
+        # 1M more resident per attribute loaded
+        mock_rss.side_effect = (i << 20 for i in range(100))
+        cache = load_budgeted_cache("test", max_memory=8 << 20)
+        self.assertEqual(cache.get("cid_strc"), self.cache.get("cid_strc"))
+        mock_tracemalloc.start.assert_not_called()
+        with self.assertRaises(MemoryBudgetError):
+            load_budgeted_cache("test", max_memory=1 << 20)
+        # Fails before loading anything
+        mock_rrCache.reset_mock()
+        with self.assertRaises(MemoryBudgetError):
+            load_budgeted_cache(
+                "test",
+                max_memory=1 << 20,
+                estimates={"rr_reactions": {"rss": 1 << 30}},
+            )
+        mock_rrCache.assert_not_called()
+
+    @patch("rxn_rebuild.stats.rrCache")
+    def test_load_shard_cache(self, mock_rrCache):
+        mock_rrCache.side_effect = lambda **kwargs: FakeCache()
+        for shard in [(0, 2), (1, 2)]:
+            info = {}
+            cache = load_budgeted_cache("test", shard=shard, info=info)
+            expected = shard_cache(self.cache, shard)
+            for attr in ("rr_reactions", "template_reactions", "cid_strc"):
+                self.assertEqual(cache.get(attr), expected.get(attr))
+            # Fingerprint of the whole cache data, whatever the shard
+            self.assertEqual(info["fingerprint"], cache_fingerprint(self.cache))
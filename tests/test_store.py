@@ -0,0 +1,100 @@
+"""
+Created on Oct 18 2026
+"""
+
+from unittest import TestCase
+from copy import deepcopy
+from os import path as os_path
+from tempfile import TemporaryDirectory
+from rxn_rebuild.rxn_rebuild import rebuild_rxn
+from rxn_rebuild.store import ResultStore
+from fake_cache import DATA, FakeCache, RULE_ID, TMPL_RXN_ID, TRANSFO
+
+
+class Test(TestCase):
+
+    def test_store(self):
+        cache = FakeCache()
+        with TemporaryDirectory() as tmpdir:
+            filename = os_path.join(tmpdir, "store.sqlite")
+            store = ResultStore(filename, cache=cache, cspace="test")
+            expected = rebuild_rxn(RULE_ID, TRANSFO, cache=cache)
+            self.assertEqual(
+                rebuild_rxn(RULE_ID, TRANSFO, cache=cache, store=store), expected
+            )
+            self.assertEqual((store.hits, store.misses, len(store)), (0, 1, 1))
+            store.close()
+
+            # Reused across runs, whatever the whitespaces
+            store = ResultStore(filename, cache=cache, cspace="test")
+            self.assertEqual(
+                rebuild_rxn(RULE_ID, f" {TRANSFO} ", cache=cache, store=store),
+                expected,
+            )
+            self.assertEqual((store.hits, store.misses), (1, 0))
+            store.close()
+
+            # Invalidated when the cache data change
+            cache.get("rr_reactions")[RULE_ID][TMPL_RXN_ID]["right_excluded"] = []
+            store = ResultStore(filename, cache=cache, cspace="test")
+            self.assertEqual(len(store), 0)
+            self.assertNotEqual(
+                rebuild_rxn(RULE_ID, TRANSFO, cache=cache, store=store), expected
+            )
+            store.close()
+
+    def test_eviction(self):
+        with TemporaryDirectory() as tmpdir:
+            store = ResultStore(
+                os_path.join(tmpdir, "store.sqlite"),
+                cache=FakeCache(),
+                cspace="test",
+                max_entries=10,
+            )
+            keys = [store.key(RULE_ID, f"A{i}=B") for i in range(10)]
+            for key in keys:
+                store.put(key, {"key": key})
+            # Most recently used
+            store.get(keys[0])
+            store.put(store.key(RULE_ID, "C=D"), {})
+            self.assertLessEqual(len(store), 10)
+            self.assertIsNotNone(store.get(keys[0]))
+            self.assertIsNone(store.get(keys[1]))
+            store.close()
+
+    def test_concurrent_stores(self):
+        cache = FakeCache()
+        with TemporaryDirectory() as tmpdir:
+            filename = os_path.join(tmpdir, "store.sqlite")
+            store_1 = ResultStore(filename, cache=cache, cspace="test")
+            store_2 = ResultStore(filename, cache=cache, cspace="test", timeout=0.1)
+            key = store_1.key(RULE_ID, TRANSFO)
+            # Results committed as soon as stored, lookups do not write
+            store_1.put(key, {"a": 1})
+            self.assertEqual(store_2.get(key), {"a": 1})
+            self.assertEqual(store_1.get(key), {"a": 1})
+            store_2.put(store_2.key(RULE_ID, "A=B"), {"b": 2})
+            # Store locked by another process: miss, result not stored
+            store_1._db.execute("BEGIN IMMEDIATE")
+            store_2.put(store_2.key(RULE_ID, "C=D"), {})
+            store_1._db.rollback()
+            self.assertIsNone(store_2.get(store_2.key(RULE_ID, "C=D")))
+            store_1.close()
+            store_2.close()
+
+    def test_concurrent_cache_data(self):
+        data = deepcopy(DATA)
+        data["rr_reactions"][RULE_ID][TMPL_RXN_ID]["right_excluded"] = []
+        with TemporaryDirectory() as tmpdir:
+            filename = os_path.join(tmpdir, "store.sqlite")
+            store_old = ResultStore(filename, cache=FakeCache(), cspace="test")
+            store_new = ResultStore(filename, cache=FakeCache(data), cspace="test")
+            key = store_new.key(RULE_ID, TRANSFO)
+            # Results of other cache data never returned
+            store_new.put(key, {"new": 1}, RULE_ID)
+            self.assertIsNone(store_old.get(key))
+            store_old.put(key, {"old": 1}, RULE_ID)
+            self.assertEqual(store_old.get(key), {"old": 1})
+            self.assertIsNone(store_new.get(key))
+            store_old.close()
+            store_new.close()
@@ -0,0 +1,39 @@
+"""
+Created on Oct 18 2026
+"""
+
+from unittest import TestCase
+from itertools import islice, repeat
+from rxn_rebuild import iter_rebuild
+from rxn_rebuild.rxn_rebuild import rebuild_rxn, ERR_UNKNOWN_RULE
+from fake_cache import FakeCache, RULE_ID, TMPL_RXN_ID, TRANSFO
+
+
+class Test(TestCase):
+
+    cache = FakeCache()
+    rows = [
+        (RULE_ID, TRANSFO),
+        ("RR-unknown", TRANSFO),
+        (RULE_ID, TRANSFO, TMPL_RXN_ID),
+    ] * 5
+
+    def test_iter_rebuild(self):
+        expected = rebuild_rxn(RULE_ID, TRANSFO, cache=self.cache)[TMPL_RXN_ID]
+        items = list(iter_rebuild(self.rows, cache=self.cache, chunk_size=4))
+        self.assertEqual([item["row"] for item in items], list(range(len(self.rows))))
+        self.assertEqual(items[0]["tmpl_rxn_id"], TMPL_RXN_ID)
+        self.assertEqual(items[0]["result"], expected)
+        self.assertEqual(items[1]["error"], ERR_UNKNOWN_RULE)
+        self.assertIsNone(items[1]["result"])
+
+    def test_iter_rebuild_lazy(self):
+        # Infinite input
+        items = iter_rebuild(repeat((RULE_ID, TRANSFO)), cache=self.cache)
+        self.assertEqual([item["row"] for item in islice(items, 3)], [0, 1, 2])
+
+    def test_iter_rebuild_workers(self):
+        self.assertEqual(
+            list(iter_rebuild(self.rows, cache=self.cache, chunk_size=2, workers=2)),
+            list(iter_rebuild(self.rows, cache=self.cache)),
+        )
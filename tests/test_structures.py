@@ -0,0 +1,103 @@
+"""
+Created on Oct 18 2026
+"""
+
+from unittest import TestCase
+from copy import deepcopy
+from rxn_rebuild.rxn_rebuild import rebuild_rxn
+from rxn_rebuild.batch import rebuild_batch
+from rxn_rebuild.structures import (
+    StructureLookup,
+    add_structures,
+    add_batch_structures,
+)
+from fake_cache import DATA, FakeCache, RULE_ID, TMPL_RXN_ID, TRANSFO
+
+
+class Test(TestCase):
+
+    def setUp(self):
+        self.cache = FakeCache()
+        data = deepcopy(DATA)
+        data["cid_strc"].update(
+            {
+                "CHEBI:15378": {"smiles": "[H+]", "inchi": "InChI=1S/p+1"},
+                "CHEBI:58210": {"smiles": "C", "inchi": None},
+                "CHEBI:57618": {"smiles": "N", "inchi": None},
+            }
+        )
+        self.full_cache = FakeCache(data)
+
+    def test_nostruct(self):
+        result = rebuild_rxn(RULE_ID, TRANSFO, cache=self.cache)[TMPL_RXN_ID]
+        add_structures(result, StructureLookup(self.cache))
+        self.assertEqual(
+            sorted((cmpd["side"], cmpd["cid"]) for cmpd in result["nostruct"]),
+            [
+                ("left", "CHEBI:15378"),
+                ("left", "CHEBI:58210"),
+                ("right", "CHEBI:57618"),
+            ],
+        )
+        self.assertIsNone(result["struct_transfo"])
+        self.assertEqual(result["structures"]["left"]["[H]O[H]"], 3)
+
+    def test_struct_transfo(self):
+        result = rebuild_rxn(RULE_ID, TRANSFO, cache=self.full_cache)[TMPL_RXN_ID]
+        add_structures(result, StructureLookup(self.full_cache))
+        self.assertEqual(result["nostruct"], [])
+        self.assertEqual(result["unconverted"], [])
+        # O=O given in input and added as CHEBI:15379
+        self.assertEqual(result["structures"]["right"]["O=O"], 2)
+        self.assertEqual(
+            result["struct_transfo"],
+            "Cc1ccc(C(C)C)cc1O.[H]O[H].[H]O[H].[H]O[H].[H+].[H+].C.C"
+            ">>CC1=CCC(C(C)C)=CC1.O=O.O=O.N.N",
+        )
+
+    def test_inchi(self):
+        result = rebuild_rxn(RULE_ID, TRANSFO, cache=self.full_cache)[TMPL_RXN_ID]
+        add_structures(result, StructureLookup(self.full_cache, "inchi"))
+        self.assertIsNone(result["struct_transfo"])
+        self.assertEqual(
+            result["structures"]["left"],
+            {"InChI=1S/H2O/h1H2": 3, "InChI=1S/p+1": 2},
+        )
+        # SMILES of the input are not converted, they do have a structure
+        self.assertIn(
+            {"smiles": "Cc1ccc(C(C)C)cc1O", "side": "left", "stoichio": 1.0},
+            result["unconverted"],
+        )
+        self.assertEqual(
+            sorted(cmpd["cid"] for cmpd in result["nostruct"]),
+            ["CHEBI:57618", "CHEBI:58210"],
+        )
+
+    def test_invalid_format(self):
+        self.assertRaises(ValueError, StructureLookup, self.cache, "mol")
+
+    def test_shared_lookup(self):
+        lookup = StructureLookup(self.cache)
+        records = [
+            {"results": rebuild_rxn(RULE_ID, TRANSFO, cache=self.cache)}
+            for _ in range(3)
+        ] + [{"results": {}}]
+        add_batch_structures(records, lookup)
+        # Each added compound looked up once
+        self.assertEqual(lookup.misses, 5)
+        add_batch_structures(
+            [{"results": rebuild_rxn(RULE_ID, TRANSFO, cache=self.cache)}], lookup
+        )
+        self.assertEqual(lookup.misses, 5)
+        self.assertEqual(lookup.hits, 5)
+
+    def test_batch(self):
+        records = list(
+            rebuild_batch(
+                [(RULE_ID, TRANSFO, None), ("RR-unknown", TRANSFO, None)],
+                cache=self.full_cache,
+                structures="smiles",
+            )
+        )
+        self.assertIsNotNone(records[0]["results"][TMPL_RXN_ID]["struct_transfo"])
+        self.assertEqual(records[1]["results"], {})